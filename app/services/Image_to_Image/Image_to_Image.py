@@ -1,22 +1,62 @@
 import os
 import time
-import base64
+import asyncio
+import binascii
 import logging
-import tempfile
-import requests
-from typing import Optional, Tuple
+import aiohttp
+from typing import Dict, Optional, Tuple, Union
 from PIL import Image
 import io
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+    logging.warning("pybase64 package not available. Install with: pip install pybase64")
 
+from ..image_fingerprint import fingerprint_image
+from ..json_codec import json_dumps, json_loads
 from .Image_to_Image_Schema import ImageToImageRequest, ImageToImageResponse, ErrorResponse
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Module logger (logging is configured once in main.py)
 logger = logging.getLogger(__name__)
 
+# Uploaded image bytes; helpers accept any contiguous buffer so they can work on a zero-copy view
+ImageBuffer = Union[bytes, bytearray, memoryview]
+
+def encode_base64(data: ImageBuffer) -> bytes:
+    """Base64-encode bytes using the SIMD pybase64 codec when available"""
+    if PYBASE64_AVAILABLE:
+        return pybase64.b64encode(data)
+    return binascii.b2a_base64(data, newline=False)
+
 class ImageToImageService:
     """Service class for handling Image-to-Image generation using BytePlus Ark API"""
     
+    # PIL format name (lowercased) -> MIME subtype used in the image data URL
+    _FORMAT_TO_MIME = {
+        "jpeg": "jpeg",
+        "jpg": "jpeg",
+        "mpo": "jpeg",
+        "png": "png",
+        "webp": "webp",
+        "bmp": "bmp",
+        "tiff": "tiff",
+        "gif": "gif"
+    }
+    
+    # Magic-number signatures of the accepted image formats, as ((offset, prefix), ...) tuples
+    _IMAGE_SIGNATURES = (
+        ((0, b"\xff\xd8\xff"),),                   # JPEG
+        ((0, b"\x89PNG\r\n\x1a\n"),),             # PNG
+        ((0, b"RIFF"), (8, b"WEBP")),             # WebP
+        ((0, b"BM"),),                            # BMP
+        ((0, b"II*\x00"),),                       # TIFF (little-endian)
+        ((0, b"MM\x00*"),),                       # TIFF (big-endian)
+        ((0, b"GIF87a"),),                        # GIF
+        ((0, b"GIF89a"),),                        # GIF
+    )
+    
     def __init__(self):
         self.api_key = os.getenv("ARK_API_KEY")
         self.model = "seedream-4-0-250828"
@@ -26,74 +66,173 @@ class ImageToImageService:
             logger.error("ARK_API_KEY not found in environment variables")
             raise ValueError("ARK_API_KEY is required")
         
+        # Request headers are the same for every call
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        # Request payload fields that are the same for every call
+        self._payload_template = {
+            "model": self.model,
+            "sequential_image_generation": "disabled",
+            "size": "4K",  # Default size
+            "response_format": "url",  # Default response format
+            "watermark": True,  # Default watermark
+            "stream": False
+        }
+        self._data_url_prefix = b"data:image/jpeg;base64,"
+        self._data_url_prefixes = {
+            image_format: f"data:image/{mime};base64,".encode('ascii')
+            for image_format, mime in self._FORMAT_TO_MIME.items()
+        }
+        
+        # Health check payload for a configured service, built once
+        self.healthy_response = {
+            "status": "healthy",
+            "message": "Image-to-Image service is running",
+            "service": "image-to-image",
+            "model": self.model,
+            "api_configured": True,
+            "sdk": "BytePlus Ark SDK"
+        }
+        
+        # Shared HTTP session, created on application startup
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.timeout = aiohttp.ClientTimeout(total=60)
+        
+        # In-flight generations keyed by request fingerprint, shared by identical concurrent requests
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
         logger.info("✅ Image-to-Image service initialized successfully")
     
-    def validate_image_file(self, image_data: bytes, max_size_mb: int = 10) -> Tuple[bool, str]:
-        """Validate uploaded image file"""
+    async def start(self):
+        """Create the shared HTTP session used for BytePlus API calls"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=100, limit_per_host=32, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+            logger.info("✅ Image-to-Image HTTP session started")
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            logger.info("Image-to-Image HTTP session closed")
+        self.session = None
+    
+    def prepare_request(self, prompt: str, image_data: ImageBuffer) -> Tuple[bool, str, Optional[bytes]]:
+        """Validate the image and build the request body in one step"""
+        is_valid, message, image_format = self.validate_image_file(image_data)
+        if not is_valid:
+            return False, message, None
+        return True, message, self.build_request_body(prompt, image_data, image_format)
+    
+    async def prepare_request_async(self, prompt: str, image_data: memoryview) -> Tuple[bool, str, Optional[bytes]]:
+        """Run validation and body encoding in a worker thread
+        
+        PIL only parses the header and pybase64 releases the GIL while encoding, so a thread
+        prepares even very large uploads without copying them to another process.
+        """
+        return await asyncio.to_thread(self.prepare_request, prompt, image_data)
+    
+    def has_image_signature(self, image_data: ImageBuffer) -> bool:
+        """Cheap magic-number check so obviously invalid uploads never reach PIL"""
+        # memoryview has no startswith, but its slices are views, so the prefix checks copy no bytes
+        view = memoryview(image_data)
+        for signature in self._IMAGE_SIGNATURES:
+            if all(view[offset:offset + len(prefix)] == prefix for offset, prefix in signature):
+                return True
+        return False
+    
+    def validate_image_file(self, image_data: ImageBuffer, max_size_mb: int = 10) -> Tuple[bool, str, Optional[str]]:
+        """Validate uploaded image file and return (is_valid, message, image_format)"""
         try:
             # Check file size
-            size_mb = len(image_data) / (1024 * 1024)
-            if size_mb > max_size_mb:
-                return False, f"Image size ({size_mb:.2f}MB) exceeds maximum allowed size ({max_size_mb}MB)"
+            if len(image_data) > max_size_mb * 1024 * 1024:
+                size_mb = len(image_data) / (1024 * 1024)
+                return False, f"Image size ({size_mb:.2f}MB) exceeds maximum allowed size ({max_size_mb}MB)", None
             
-            # Check if it's a valid image by trying to decode
+            # Reject unknown formats before handing the data to PIL
+            if not self.has_image_signature(image_data):
+                return False, "Unsupported image format", None
+            
+            # Check if it's a valid image by parsing its header (no pixel decode needed)
             try:
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()
-                
-                # Get image dimensions
-                img = Image.open(io.BytesIO(image_data))  # Reopen after verify
-                width, height = img.size
+                # BytesIO copies the buffer, which PIL needs as a seekable file
+                with Image.open(io.BytesIO(image_data)) as img:
+                    width, height = img.size
+                    image_format = (img.format or "jpeg").lower()
                 
                 # Check minimum dimensions
                 if width < 32 or height < 32:
-                    return False, "Image is too small (minimum 32x32 pixels)"
+                    return False, "Image is too small (minimum 32x32 pixels)", None
                 
                 # Check maximum dimensions  
                 if width > 4096 or height > 4096:
-                    return False, "Image is too large (maximum 4096x4096 pixels)"
+                    return False, "Image is too large (maximum 4096x4096 pixels)", None
                 
             except Exception as e:
-                return False, f"Invalid image file: {str(e)}"
+                return False, f"Invalid image file: {str(e)}", None
             
-            return True, "Valid image"
+            return True, "Valid image", image_format
             
         except Exception as e:
-            return False, f"Error validating image: {str(e)}"
+            return False, f"Error validating image: {str(e)}", None
     
-    def save_temp_image(self, image_data: bytes) -> Optional[str]:
-        """Save image data to temporary file and return the path"""
-        try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                temp_file.write(image_data)
-                temp_path = temp_file.name
-            
-            return temp_path
-        except Exception as e:
-            logger.error(f"Error saving temporary image: {str(e)}")
-            return None
+    def build_request_body(self, prompt: str, image_data: ImageBuffer, image_format: Optional[str] = None) -> bytes:
+        """Serialize the BytePlus request body with the image as a base64 data URL"""
+        payload = json_dumps({**self._payload_template, "prompt": prompt})
+        data_url_prefix = self._data_url_prefixes.get(image_format, self._data_url_prefix)
+        
+        # Base64 output is plain ASCII and needs no JSON escaping, so the encoded bytes
+        # are spliced straight into the body instead of going through a str
+        return b"".join((
+            payload[:-1],
+            b',"image":"',
+            data_url_prefix,
+            encode_base64(image_data),
+            b'"}'
+        ))
     
-    def cleanup_temp_file(self, file_path: str):
-        """Clean up temporary file"""
-        try:
-            if file_path and os.path.exists(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            logger.warning(f"Could not clean up temporary file {file_path}: {str(e)}")
+    def request_fingerprint(self, prompt: str, image_data: ImageBuffer) -> str:
+        """Key identifying an (image, prompt) pair for request coalescing"""
+        return f"{fingerprint_image(image_data)}:{prompt}"
     
     async def generate_image_to_image(
         self, 
         request: ImageToImageRequest, 
-        image_data: bytes
+        image_data: ImageBuffer
+    ) -> ImageToImageResponse:
+        """Generate image-to-image, coalescing identical concurrent requests into one API call"""
+        # Share one zero-copy view of the upload between hashing, validation and encoding
+        image_data = memoryview(image_data)
+        
+        # Both hash backends release the GIL on large inputs, so hash the upload in a worker thread
+        key = await asyncio.to_thread(self.request_fingerprint, request.prompt, image_data)
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_image_to_image(request, image_data))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Joining in-flight generation for identical request: %.50s...", request.prompt)
+        
+        # Shield the shared task so one client disconnecting does not cancel it for the others
+        return await asyncio.shield(task)
+    
+    async def _generate_image_to_image(
+        self, 
+        request: ImageToImageRequest, 
+        image_data: memoryview
     ) -> ImageToImageResponse:
         """Generate image-to-image using BytePlus Ark SDK"""
         start_time = time.time()
-        temp_image_path = None
         
         try:
-            # Validate the input image
-            is_valid, validation_message = self.validate_image_file(image_data)
+            # Validate the input image and build the request body
+            # The BytePlus images API only accepts JSON, so the image is sent as a base64 data URL
+            is_valid, validation_message, request_body = await self.prepare_request_async(request.prompt, image_data)
             if not is_valid:
                 return ImageToImageResponse(
                     success=False,
@@ -102,95 +241,61 @@ class ImageToImageService:
                     model_used=self.model
                 )
             
-            # Save image to temporary file (BytePlus SDK might need file path)
-            temp_image_path = self.save_temp_image(image_data)
-            if not temp_image_path:
-                return ImageToImageResponse(
-                    success=False,
-                    message="Failed to process uploaded image",
-                    prompt_used=request.prompt,
-                    model_used=self.model
-                )
-            
-            # For this example, we'll use a base64 data URL
-            # In production, you might want to upload to cloud storage
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-            image_url = f"data:image/jpeg;base64,{base64_image}"
+            logger.info("Generating image with prompt: %.50s...", request.prompt)
             
-            logger.info(f"Generating image with prompt: {request.prompt[:50]}...")
+            # Make sure the shared session exists (e.g. when used outside the app lifecycle)
+            if self.session is None or self.session.closed:
+                await self.start()
             
-            # Prepare the request payload for BytePlus API
-            payload = {
-                "model": self.model,
-                "prompt": request.prompt,
-                "image": image_url,  # Using base64 data URL
-                "sequential_image_generation": "disabled",
-                "size": "4K",  # Default size
-                "response_format": "url",  # Default response format
-                "watermark": True,  # Default watermark
-                "stream": False
-            }
-            
-            # Prepare headers
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            # Generate image using BytePlus API via requests
+            # Generate image using BytePlus API via the shared aiohttp session
             try:
-                response = requests.post(
+                async with self.session.post(
                     self.base_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=60
-                )
-                
-                generation_time = time.time() - start_time
-                
-                if response.status_code == 200:
-                    response_data = response.json()
+                    data=request_body,
+                    headers=self._headers,
+                    timeout=self.timeout
+                ) as response:
                     
-                    # Extract the generated image data
-                    generated_image_url = None
-                    generated_image_data = None
+                    generation_time = time.time() - start_time
                     
-                    if 'data' in response_data and len(response_data['data']) > 0:
-                        first_result = response_data['data'][0]
-                        
-                        # Always use URL format as default
-                        if 'url' in first_result:
-                            generated_image_url = first_result['url']
+                    raw_body = await response.read()
                     
-                    return ImageToImageResponse(
-                        success=True,
-                        message="Image generated successfully",
-                        image_url=generated_image_url,
-                        image_data=generated_image_data,
-                        prompt_used=request.prompt,
-                        model_used=self.model,
-                        generation_time=generation_time
-                    )
-                else:
-                    error_message = f"API request failed with status {response.status_code}"
-                    try:
-                        error_data = response.json()
-                        if 'error' in error_data:
+                    if response.status == 200:
+                        # Only the first result's URL is used (URL response format is the default)
+                        response_data = json_loads(raw_body)
+                        generated_image_url = (response_data.get('data') or [{}])[0].get('url')
+                        
+                        return ImageToImageResponse(
+                            success=True,
+                            message="Image generated successfully",
+                            image_url=generated_image_url,
+                            image_data=None,
+                            prompt_used=request.prompt,
+                            model_used=self.model,
+                            generation_time=generation_time
+                        )
+                    else:
+                        error_message = f"API request failed with status {response.status}"
+                        try:
+                            error_data = json_loads(raw_body) if raw_body else {}
+                        except ValueError:
+                            error_data = None
+                        if isinstance(error_data, dict) and 'error' in error_data:
                             error_message += f": {error_data['error']}"
-                    except:
-                        error_message += f": {response.text[:200]}"
-                    
-                    logger.error(f"BytePlus API error: {error_message}")
-                    
-                    return ImageToImageResponse(
-                        success=False,
-                        message=error_message,
-                        prompt_used=request.prompt,
-                        model_used=self.model,
-                        generation_time=generation_time
-                    )
+                        elif error_data is None:
+                            error_message += f": {raw_body[:200].decode('utf-8', 'replace')}"
+                        
+                        logger.error("BytePlus API error: %s", error_message)
+                        
+                        return ImageToImageResponse(
+                            success=False,
+                            message=error_message,
+                            prompt_used=request.prompt,
+                            model_used=self.model,
+                            generation_time=generation_time
+                        )
                     
-            except requests.exceptions.Timeout:
+            except asyncio.TimeoutError:
                 return ImageToImageResponse(
                     success=False,
                     message="Request timeout - image generation took too long",
@@ -198,8 +303,8 @@ class ImageToImageService:
                     model_used=self.model,
                     generation_time=time.time() - start_time
                 )
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request exception: {str(e)}")
+            except aiohttp.ClientError as e:
+                logger.error("Request exception: %s", e)
                 return ImageToImageResponse(
                     success=False,
                     message=f"Network error: {str(e)}",
@@ -209,7 +314,7 @@ class ImageToImageService:
                 )
                 
         except Exception as e:
-            logger.error(f"Unexpected error in image generation: {str(e)}")
+            logger.error("Unexpected error in image generation: %s", e)
             return ImageToImageResponse(
                 success=False,
                 message=f"Unexpected error: {str(e)}",
@@ -217,10 +322,6 @@ class ImageToImageService:
                 model_used=self.model,
                 generation_time=time.time() - start_time
             )
-        finally:
-            # Clean up temporary file
-            if temp_image_path:
-                self.cleanup_temp_file(temp_image_path)
 
 # Create a singleton instance
 image_to_image_service = ImageToImageService()
\ No newline at end of file
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 import logging
 from typing import Optional
 
@@ -10,13 +12,61 @@ from .Image_to_Image_Schema import (
 )
 from .Image_to_Image import image_to_image_service
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Module logger (logging is configured once in main.py)
 logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(tags=["Image to Image"])
 
+# Static service information returned by the info endpoint
+SERVICE_INFO = {
+    "service": "image-to-image",
+    "description": "Generate new images based on input images and text prompts using BytePlus Ark AI",
+    "model": "seedream-4-0-250828",
+    "sdk": "BytePlus Ark SDK",
+    "supported_formats": ["JPEG", "PNG", "WebP", "BMP", "TIFF", "GIF"],
+    "max_file_size": "10MB",
+    "default_size": "2K",
+    "default_response_format": "url",
+    "default_watermark": True,
+    "features": {
+        "simplified_api": "Streamlined API with sensible defaults",
+        "prompt_based": "Natural language prompts for image transformation",
+        "high_quality": "AI-powered image generation with seedream model"
+    },
+    "limits": {
+        "prompt_length": "1-1000 characters",
+        "image_dimensions": "32x32 to 4096x4096 pixels",
+        "concurrent_requests": "As per BytePlus API limits"
+    }
+}
+
+# Uploads are read in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Maximum accepted image size, plus headroom for the other multipart form fields
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_FORM_OVERHEAD = 64 * 1024
+
+def image_too_large() -> HTTPException:
+    """Build the error raised for oversized uploads"""
+    return HTTPException(
+        status_code=413,
+        detail=f"Image file too large (maximum {MAX_IMAGE_SIZE // (1024 * 1024)}MB)"
+    )
+
+async def read_upload(upload: UploadFile, max_size: int = MAX_IMAGE_SIZE) -> bytearray:
+    """Read an uploaded file in chunks into a single buffer, aborting past max_size"""
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_size:
+            raise image_too_large()
+    return buffer
+
 @router.post(
     "/image-to-image",
     response_model=ImageToImageResponse,
@@ -32,6 +82,7 @@ router = APIRouter(tags=["Image to Image"])
     """
 )
 async def generate_image_to_image(
+    http_request: Request,
     image: UploadFile = File(
         ..., 
         description="Input image file (JPEG, PNG, etc.) - max 10MB",
@@ -39,16 +90,14 @@ async def generate_image_to_image(
     ),
     prompt: str = Form(
         ..., 
-        description="Text prompt describing the desired image transformation",
-        min_length=1,
-        max_length=1000
+        description="Text prompt describing the desired image transformation (1-1000 characters)"
     )
 ):
     """Generate image-to-image transformation"""
     
     try:
         # Log the incoming request
-        logger.info(f"Received image-to-image request: prompt='{prompt[:50]}...'")
+        logger.info("Received image-to-image request: prompt='%.50s...'", prompt)
         
         # Validate file type
         if not image.content_type or not image.content_type.startswith('image/'):
@@ -57,38 +106,50 @@ async def generate_image_to_image(
                 detail="Invalid file type. Please upload an image file (JPEG, PNG, etc.)"
             )
         
+        # Reject oversized uploads before reading them
+        content_length = http_request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_SIZE + MAX_FORM_OVERHEAD:
+            raise image_too_large()
+        if image.size is not None and image.size > MAX_IMAGE_SIZE:
+            raise image_too_large()
+        
         # Read the image data
         try:
-            image_data = await image.read()
+            image_data = await read_upload(image)
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error reading uploaded image: {str(e)}")
+            logger.error("Error reading uploaded image: %s", e)
             raise HTTPException(status_code=400, detail="Error reading uploaded image file")
         
         # Validate image data
         if not image_data:
             raise HTTPException(status_code=400, detail="Empty image file")
         
-        # Create request object
-        request = ImageToImageRequest(
-            prompt=prompt
-        )
+        # Create request object (the schema strips and length-checks the prompt)
+        try:
+            request = ImageToImageRequest(
+                prompt=prompt
+            )
+        except ValidationError as e:
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
         
         # Generate the image
         result = await image_to_image_service.generate_image_to_image(request, image_data)
         
         # Log the result
         if result.success:
-            logger.info(f"Successfully generated image in {result.generation_time:.2f}s")
+            logger.info("Successfully generated image in %.2fs", result.generation_time)
         else:
-            logger.warning(f"Image generation failed: {result.message}")
+            logger.warning("Image generation failed: %s", result.message)
         
         return result
         
-    except HTTPException:
-        # Re-raise HTTP exceptions
+    except (HTTPException, RequestValidationError):
+        # Re-raise HTTP and validation errors
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in image-to-image endpoint: {str(e)}")
+        logger.error("Unexpected error in image-to-image endpoint: %s", e)
         return ImageToImageResponse(
             success=False,
             message=f"Internal server error: {str(e)}",
@@ -103,36 +164,19 @@ async def generate_image_to_image(
 )
 async def health_check():
     """Health check endpoint for image-to-image service"""
-    try:
-        # Check if service is properly initialized
-        if not image_to_image_service.api_key:
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "status": "unhealthy",
-                    "message": "ARK_API_KEY not configured",
-                    "service": "image-to-image"
-                }
-            )
-        
-        return {
-            "status": "healthy",
-            "message": "Image-to-Image service is running",
-            "service": "image-to-image",
-            "model": image_to_image_service.model,
-            "api_configured": True,
-            "sdk": "BytePlus Ark SDK"
+    # Fast path: a configured service always reports the same prebuilt payload
+    if image_to_image_service.api_key:
+        return image_to_image_service.healthy_response
+    
+    # Service is not properly initialized
+    return JSONResponse(
+        status_code=500,
+        content={
+            "status": "unhealthy",
+            "message": "ARK_API_KEY not configured",
+            "service": "image-to-image"
         }
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return JSONResponse(
-            status_code=500,
-            content={
-                "status": "unhealthy",
-                "message": f"Service error: {str(e)}",
-                "service": "image-to-image"
-            }
-        )
+    )
 
 @router.get(
     "/image-to-image/info",
@@ -141,24 +185,4 @@ async def health_check():
 )
 async def service_info():
     """Get service information and capabilities"""
-    return {
-        "service": "image-to-image",
-        "description": "Generate new images based on input images and text prompts using BytePlus Ark AI",
-        "model": "seedream-4-0-250828",
-        "sdk": "BytePlus Ark SDK",
-        "supported_formats": ["JPEG", "PNG", "WebP", "BMP", "TIFF"],
-        "max_file_size": "10MB",
-        "default_size": "2K",
-        "default_response_format": "url",
-        "default_watermark": True,
-        "features": {
-            "simplified_api": "Streamlined API with sensible defaults",
-            "prompt_based": "Natural language prompts for image transformation",
-            "high_quality": "AI-powered image generation with seedream model"
-        },
-        "limits": {
-            "prompt_length": "1-1000 characters",
-            "image_dimensions": "32x32 to 4096x4096 pixels",
-            "concurrent_requests": "As per BytePlus API limits"
-        }
-    }
\ No newline at end of file
+    return SERVICE_INFO
@@ -1,20 +1,13 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Optional
 
 class ImageToImageRequest(BaseModel):
     """Request schema for Image-to-Image generation"""
-    prompt: str = Field(
+    # Stripping and length checks run in one constrained-str validator
+    prompt: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=1000)] = Field(
         ..., 
-        min_length=1, 
-        max_length=1000, 
         description="Text prompt describing the desired image transformation"
     )
-    
-    @validator('prompt')
-    def validate_prompt(cls, v):
-        if not v or not v.strip():
-            raise ValueError('Prompt cannot be empty')
-        return v.strip()
 
 class ImageToImageResponse(BaseModel):
     """Response schema for Image-to-Image generation"""
@@ -1,21 +1,32 @@
 import time
+import json
+import asyncio
 import logging
 import os
+import re
+import sys
+import io
 import base64
-from typing import Dict, List, Optional
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+import importlib.util
+import itertools
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple, Union
+# openai is imported lazily in TextWithImageService.__init__ so template-only deployments skip its import cost
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
+if not OPENAI_AVAILABLE:
     logging.warning("OpenAI package not available. Install with: pip install openai")
 
 try:
-    from PIL import Image
+    from PIL import ExifTags, Image, ImageOps
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
     logging.warning("PIL package not available. Install with: pip install Pillow")
+
+from ..image_fingerprint import fingerprint_image
+from ..json_codec import json_dumps, json_loads
 from .Text_with_image_Schema import (
     TextWithImageRequest,
     GeneratedStory,
@@ -26,119 +37,447 @@ from .Text_with_image_Schema import (
     ChapterEnum
 )
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Module logger (logging is configured once in main.py)
 logger = logging.getLogger(__name__)
 
+# Story templates per language, rendered with name/age/gender_adj/idea
+_STORY_TEMPLATES: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    "English": MappingProxyType({
+        "intro": "Once upon a time, there was a {gender_adj} {age}-year-old named {name}.",
+        "adventure_start": "{name} discovered something magical that would change everything.",
+        "conflict": "But {name} faced a great challenge that tested their courage.",
+        "resolution": "With determination and heart, {name} found a way to overcome the obstacle.",
+        "ending": "And so {name} learned that with courage and kindness, anything is possible."
+    }),
+    "Spanish": MappingProxyType({
+        "intro": "Érase una vez, había {gender_adj} {age} años llamado {name}.",
+        "adventure_start": "{name} descubrió algo mágico que lo cambiaría todo.",
+        "conflict": "Pero {name} enfrentó un gran desafío que puso a prueba su valor.",
+        "resolution": "Con determinación y corazón, {name} encontró una manera de superar el obstáculo.",
+        "ending": "Y así {name} aprendió que con valor y bondad, todo es posible."
+    }),
+    "French": MappingProxyType({
+        "intro": "Il était une fois, il y avait {gender_adj} de {age} ans nommé {name}.",
+        "adventure_start": "{name} découvrit quelque chose de magique qui allait tout changer.",
+        "conflict": "Mais {name} fit face à un grand défi qui testa son courage.",
+        "resolution": "Avec détermination et cœur, {name} trouva un moyen de surmonter l'obstacle.",
+        "ending": "Et ainsi {name} apprit qu'avec courage et gentillesse, tout est possible."
+    }),
+    "Italian": MappingProxyType({
+        "intro": "C'era una volta {gender_adj} di {age} anni chiamato {name}.",
+        "adventure_start": "{name} scoprì qualcosa di magico che avrebbe cambiato tutto.",
+        "conflict": "Ma {name} affrontò una grande sfida che mise alla prova il suo coraggio.",
+        "resolution": "Con determinazione e cuore, {name} trovò un modo per superare l'ostacolo.",
+        "ending": "E così {name} imparò che con coraggio e gentilezza, tutto è possibile."
+    }),
+    "Arabic": MappingProxyType({
+        "intro": "كان يا ما كان، كان هناك {gender_adj} يبلغ من العمر {age} عامًا يُدعى {name}.",
+        "adventure_start": "اكتشف {name} شيئًا سحريًا من شأنه أن يغير كل شيء.",
+        "conflict": "لكن {name} واجه تحديًا كبيرًا اختبر شجاعته.",
+        "resolution": "بالعزيمة والقلب، وجد {name} طريقة للتغلب على العقبة.",
+        "ending": "وهكذا تعلم {name} أنه بالشجاعة واللطف، كل شيء ممكن."
+    })
+})
+
+# Style-specific prompts for image generation
+_STYLE_PROMPTS: Mapping[str, str] = MappingProxyType({
+    "Cartoon": "bright, animated, cartoon-style illustration with bold colors and fun characters",
+    "Storybook": "classic storybook illustration with soft watercolor style and whimsical details",
+    "Illustration": "detailed digital illustration with rich colors and artistic composition",
+    "Colorful": "vibrant, colorful artwork with dynamic composition and cheerful atmosphere",
+    "Simple": "minimalist, clean illustration with simple shapes and gentle colors"
+})
+
+# Gender-appropriate character adjectives per language
+_GENDER_MAP: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    "English": MappingProxyType({"Male": "a young boy", "Female": "a young girl"}),
+    "Spanish": MappingProxyType({"Male": "un niño", "Female": "una niña"}),
+    "French": MappingProxyType({"Male": "un garçon", "Female": "une fille"}),
+    "Italian": MappingProxyType({"Male": "un ragazzo", "Female": "una ragazza"}),
+    "Arabic": MappingProxyType({"Male": "فتى", "Female": "فتاة"})
+})
+
+# Number of pages generated for each chapter selection
+_CHAPTER_MAP: Mapping[str, int] = MappingProxyType({
+    "Single": 1,
+    "Two": 2,
+    "Four": 4,
+    "Six": 6,
+    "Ten": 10
+})
+
+# OpenAI completion budget: a 25-word page plus its JSON fields stays well under the per-page
+# allowance even for languages that tokenize poorly (e.g. Arabic)
+_OPENAI_TOKENS_PER_PAGE = 120
+_OPENAI_MIN_TOKENS = 200
+_OPENAI_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Structured output schema for story pages; strict mode guarantees the shape, so the prompt
+# does not need to carry a JSON example
+_OPENAI_STORY_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "story_pages",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "pages": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "page_number": {"type": "integer"},
+                            "title": {"type": "string"},
+                            "content": {"type": "string", "description": "Story content (max 25 words)"}
+                        },
+                        "required": ["page_number", "title", "content"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["pages"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# OpenAI HTTP connection pool shared by all requests of the service singleton; the timeout
+# keeps a hung call from holding a concurrency slot for openai's 10 minute default
+_OPENAI_MAX_CONNECTIONS = 50
+_OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20
+_OPENAI_KEEPALIVE_EXPIRY = 60
+_OPENAI_TIMEOUT = 60.0
+
+# OpenAI Batch API settings for bulk story pre-generation
+_OPENAI_BATCH_ENDPOINT = "/v1/chat/completions"
+_OPENAI_BATCH_WINDOW = "24h"
+_OPENAI_BATCH_FAILED_STATUSES = frozenset({"failed", "expired", "cancelling", "cancelled"})
+# Batch metadata key holding the id of the uploaded file with the batch's story requests
+_OPENAI_BATCH_REQUESTS_KEY = "story_requests_file_id"
+# Batch uploads and results (which hold children's names and story ideas) expire from OpenAI file storage after a week
+_OPENAI_BATCH_FILE_EXPIRY = {"anchor": "created_at", "seconds": 7 * 24 * 60 * 60}
+
+# Story template format_map callables per language, bound once so pages render from the elements dict directly
+_TEMPLATE_FORMATTERS: Mapping[str, Mapping[str, Callable[[Dict], str]]] = MappingProxyType({
+    language: MappingProxyType({key: template.format_map for key, template in templates.items()})
+    for language, templates in _STORY_TEMPLATES.items()
+})
+
+def _build_prefix(style: str, language: str, gender: str) -> Tuple[str, str, str, str]:
+    """Prompt pieces for one combination: style prompt, gender adjective, its lowercase form and the lowercase style name."""
+    gender_adj = _GENDER_MAP.get(language, {}).get(gender, "a child")
+    return _STYLE_PROMPTS.get(style, "illustration"), gender_adj, gender_adj.lower(), style.lower()
+
+# Precomputed prompt pieces per (style, language, gender)
+_PREFIX_CACHE: Mapping[Tuple[str, str, str], Tuple[str, str, str, str]] = MappingProxyType({
+    (style.value, language.value, gender.value): _build_prefix(style.value, language.value, gender.value)
+    for style, language, gender in itertools.product(StyleEnum, LanguageEnum, GenderEnum)
+})
+
+# In-memory cache of OpenAI-generated story pages for repeated identical requests
+_STORY_CACHE_SIZE = 1024
+_STORY_CACHE_TTL = 3600  # seconds
+
+# Uploaded photos are turned upright and downscaled to this longest edge (and re-encoded as JPEG) before Vision analysis
+_VISION_MAX_EDGE = 1024
+_VISION_JPEG_QUALITY = 85
+
+# PIL formats Vision accepts as uploaded -> MIME subtype of the data URL; other formats are re-encoded as JPEG
+_VISION_MIME_SUBTYPES: Mapping[str, str] = MappingProxyType({
+    "JPEG": "jpeg",
+    "PNG": "png",
+    "WEBP": "webp",
+    "GIF": "gif"
+})
+
+# Number of distinct uploaded images whose Vision analysis is kept in memory
+_VISION_CACHE_SIZE = 256
+
+# OpenAI Vision prompt for extracting the character's physical features from an uploaded photo
+_VISION_ANALYSIS_PROMPT = """
+            Analyze this image of a person and extract the following physical characteristics:
+            1. Skin color (be specific: light, medium, tan, brown, dark, etc.)
+            2. Hair color (be specific: blonde, brown, black, red, gray, etc.)
+            3. Eyebrow color (usually matches hair color)
+            
+            Return ONLY a JSON object with keys skin_color, hair_color, eyebrow_color.
+            
+            Be descriptive but concise. Focus on the main character in the image.
+            """
+_VISION_MODEL = "gpt-4o-mini"
+_VISION_FEATURE_KEYS = ("skin_color", "hair_color", "eyebrow_color")
+
+# OpenAI story generation prompt pieces
+_OPENAI_SYSTEM_MSG = {"role": "system", "content": "You are a professional children's story writer. Always respond with valid JSON format."}
+_OPENAI_PROMPT_TEMPLATE = """
+            Create a {total_pages}-page children's story about {name}, a {age}-year-old {gender} character.
+            Story theme: {story_idea}
+            Style: {style}
+            Language: {language}
+            
+            Requirements:
+            - Each page should have EXACTLY 25 words or less
+            - Distribute the complete story across {total_pages} pages
+            - Make it age-appropriate and engaging
+            - Each page should advance the story
+            """
+
+# Scene keyword tables used to detect elements in page content. Each table is an ordered tuple of
+# (description, keywords) pairs where earlier entries win; location descriptions carry their "in " prefix.
+_SCENE_KEYWORD_TABLES = {
+    "locations": (
+        ("in forest", ("forest", "trees", "woods", "jungle")),
+        ("in magical enchanted forest with glowing trees and fairy lights", ("magical forest", "enchanted", "fairy")),
+        ("in royal castle with tall towers and golden gates", ("castle", "palace", "kingdom", "royal")),
+        ("in beautiful garden with colorful flowers and butterflies", ("garden", "flowers", "butterfly", "bloom")),
+        ("in mysterious cave with sparkling crystals", ("cave", "crystal", "underground")),
+        ("in peaceful meadow with rolling hills", ("meadow", "field", "grass", "hills")),
+        ("in cozy home with warm lighting", ("home", "house", "room", "attic")),
+        ("in starry night sky with twinkling stars", ("night", "stars", "moon", "sky")),
+        ("in sunny beach with golden sand", ("beach", "sand", "ocean", "sea")),
+        ("in snowy mountain peak", ("mountain", "snow", "peak", "cold")),
+    ),
+    "items": (
+        ("holding a magical paintbrush", ("paint", "brush", "canvas", "art")),
+        ("surrounded by colorful butterflies", ("butterfly", "butterflies")),
+        ("with a wise owl companion", ("owl", "bird")),
+        ("near a treasure chest", ("treasure", "chest", "gold")),
+        ("with a glowing wand", ("wand", "magic", "spell")),
+        ("reading an ancient book", ("book", "reading", "story")),
+        ("wearing a beautiful crown", ("crown", "princess", "prince")),
+        ("with a friendly dragon", ("dragon", "creature")),
+        ("holding a lantern", ("lantern", "light", "glow")),
+        ("with musical instruments", ("music", "song", "singing")),
+    ),
+    "actions": (
+        ("dancing gracefully", ("dance", "dancing", "twirl")),
+        ("running through the scene", ("running", "chase", "hurry", "race")),
+        ("flying through the air", ("fly", "flying", "soar")),
+        ("climbing or exploring", ("climb", "explore", "adventure")),
+        ("painting or creating art", ("paint", "draw", "create", "art")),
+        ("discovering something wonderful", ("discover", "find", "found", "surprise")),
+        ("talking to animals", ("talk", "speak", "conversation", "animal")),
+        ("solving a puzzle or problem", ("solve", "think", "problem", "puzzle")),
+        ("helping friends", ("help", "friend", "together", "team")),
+        ("celebrating or cheering", ("celebrate", "cheer", "victory", "success")),
+    ),
+    "emotions": (
+        ("with a bright, joyful smile", ("happy", "joy", "smile", "laugh", "giggle")),
+        ("with wonder and curiosity in their eyes", ("wonder", "curious", "amazed", "surprise")),
+        ("with determination and courage", ("brave", "courage", "determined", "strong")),
+        ("with a gentle, kind expression", ("kind", "gentle", "caring", "love")),
+        ("with excitement and energy", ("excited", "energy", "enthusiastic")),
+        ("with peaceful contentment", ("peaceful", "calm", "content", "serene")),
+        ("with focused concentration", ("focus", "concentrate", "think", "study")),
+        ("with magical sparkles around them", ("magic", "magical", "sparkle", "glow")),
+    )
+}
+
+# Interned copy of the tables so every lookup shares one string object per keyword
+_SCENE_KEYWORDS: Mapping[str, Tuple[Tuple[str, Tuple[str, ...]], ...]] = MappingProxyType({
+    category: tuple((description, tuple(sys.intern(keyword) for keyword in keywords)) for description, keywords in table)
+    for category, table in _SCENE_KEYWORD_TABLES.items()
+})
+
+def _keyword_trie_regex(keywords) -> str:
+    """Build an alternation shaped like a prefix trie so the regex engine follows one branch per character.
+    
+    Optional suffixes are greedy, so the match at each position is the longest keyword starting there.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+    
+    return build(trie)
+
+def _compile_scene_matcher(scene_keywords) -> Tuple["re.Pattern", Dict[str, int], Dict[str, int], Tuple[str, ...]]:
+    """Compile all scene keywords into one scanner and a bit per table entry.
+    
+    Entries get consecutive bits in table order, so the lowest set bit of a category mask is its first match.
+    The lookahead reports the longest keyword starting at every position, so each keyword's mask
+    also includes the entries of all keywords contained in it.
+    """
+    entry_masks = {}
+    category_masks = {}
+    bit_descriptions = []
+    for category, table in scene_keywords.items():
+        category_masks[category] = 0
+        for description, keywords in table:
+            bit = 1 << len(bit_descriptions)
+            bit_descriptions.append(description)
+            category_masks[category] |= bit
+            for keyword in keywords:
+                entry_masks[keyword] = entry_masks.get(keyword, 0) | bit
+    
+    pattern = re.compile("(?=(" + _keyword_trie_regex(entry_masks) + "))")
+    keyword_masks = {}
+    for keyword in entry_masks:
+        keyword_masks[keyword] = 0
+        for other in entry_masks:
+            if other in keyword:
+                keyword_masks[keyword] |= entry_masks[other]
+    return pattern, keyword_masks, category_masks, tuple(bit_descriptions)
+
+# Scene keyword scanner, keyword -> entry bits, category -> entry bits, and entry bit -> description
+_SCENE_MATCHER = _compile_scene_matcher(_SCENE_KEYWORDS)
+
+# Common long words skipped when picking a page's key words
+_STOPWORDS = frozenset({'there', 'where', 'their', 'would', 'could', 'should', 'about', 'after', 'before'})
+
+# Whitespace-delimited words longer than four characters (punctuation stays part of the word); matched on
+# the original-case text because lowercasing can change a word's length (e.g. 'İ' -> 'i̇')
+_KEY_WORD_PATTERN = re.compile(r"(?<!\S)\S{5,}(?!\S)")
+
+# Any lowercase ASCII letter; content without one cannot contain a scene keyword
+_ASCII_LETTER_PATTERN = re.compile("[a-z]")
+
+# Opening of the pages array in a streamed story completion, and the separators between its items
+_PAGES_ARRAY_PATTERN = re.compile(r'"pages"\s*:\s*\[')
+_ARRAY_SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+
+class _StoryPageStreamParser:
+    """Incrementally extract complete page objects from a streamed {"pages": [...]} completion."""
+    
+    _decoder = json.JSONDecoder()
+    
+    def __init__(self):
+        self.buffer = ""
+        self.in_pages = False
+        self.finished = False
+    
+    def feed(self, text: str) -> List[dict]:
+        """Add streamed text and return the page objects it completed."""
+        self.buffer += text
+        if not self.in_pages:
+            match = _PAGES_ARRAY_PATTERN.search(self.buffer)
+            if match is None:
+                return []
+            self.buffer = self.buffer[match.end():]
+            self.in_pages = True
+        
+        pages = []
+        pos = 0
+        while not self.finished:
+            pos = _ARRAY_SEPARATOR_PATTERN.match(self.buffer, pos).end()
+            if pos == len(self.buffer):
+                break
+            if self.buffer[pos] == "]":
+                self.finished = True
+                break
+            try:
+                page, pos = self._decoder.raw_decode(self.buffer, pos)
+            except ValueError:
+                # The page object is still incomplete
+                break
+            pages.append(page)
+        
+        # Drop consumed text so each feed only rescans the unfinished page
+        self.buffer = self.buffer[pos:]
+        return pages
+
 class TextWithImageService:
     """Service class for generating stories with images based on user input."""
     
     def __init__(self):
-        self.story_templates = self._initialize_story_templates()
-        self.style_prompts = self._initialize_style_prompts()
+        self.story_templates = _STORY_TEMPLATES
+        self.template_formatters = _TEMPLATE_FORMATTERS
+        self.style_prompts = _STYLE_PROMPTS
+        self.prefix_cache = _PREFIX_CACHE
+        self.scene_keywords = _SCENE_KEYWORDS
+        self.scene_pattern, self.scene_keyword_masks, self.scene_category_masks, self.scene_bit_descriptions = _SCENE_MATCHER
+        self._service_info = self._initialize_service_info()
         
         # OpenAI configuration
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.openai_model = "gpt-3.5-turbo"
+        self.openai_model = "gpt-4o-mini"
+        
+        # Transient failures (429 rate limits, 5xx, connection errors) are retried by the SDK with
+        # jittered exponential backoff that honors Retry-After before falling back to templates
+        self.openai_max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
         
         if OPENAI_AVAILABLE and self.openai_api_key:
-            self.openai_client = openai.OpenAI(api_key=self.openai_api_key)
+            import httpx
+            import openai
+            # Pooled keep-alive connections shared by every request this process serves
+            limits = httpx.Limits(
+                max_connections=_OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=_OPENAI_KEEPALIVE_EXPIRY
+            )
+            self.openai_client = openai.OpenAI(
+                api_key=self.openai_api_key,
+                timeout=_OPENAI_TIMEOUT,
+                max_retries=self.openai_max_retries,
+                http_client=openai.DefaultHttpxClient(limits=limits)
+            )
+            self.async_openai_client = openai.AsyncOpenAI(
+                api_key=self.openai_api_key,
+                timeout=_OPENAI_TIMEOUT,
+                max_retries=self.openai_max_retries,
+                http_client=openai.DefaultAsyncHttpxClient(limits=limits)
+            )
             logger.info("OpenAI API configured successfully")
         else:
             self.openai_client = None
+            self.async_openai_client = None
             logger.warning("OpenAI not available or API key not set. Using template-based stories.")
         
-    def _initialize_story_templates(self) -> Dict[str, Dict[str, str]]:
-        """Initialize story templates for different languages."""
-        return {
-            "English": {
-                "intro": "Once upon a time, there was a {gender_adj} {age}-year-old named {name}.",
-                "adventure_start": "{name} discovered something magical that would change everything.",
-                "conflict": "But {name} faced a great challenge that tested their courage.",
-                "resolution": "With determination and heart, {name} found a way to overcome the obstacle.",
-                "ending": "And so {name} learned that with courage and kindness, anything is possible."
-            },
-            "Spanish": {
-                "intro": "Érase una vez, había {gender_adj} {age} años llamado {name}.",
-                "adventure_start": "{name} descubrió algo mágico que lo cambiaría todo.",
-                "conflict": "Pero {name} enfrentó un gran desafío que puso a prueba su valor.",
-                "resolution": "Con determinación y corazón, {name} encontró una manera de superar el obstáculo.",
-                "ending": "Y así {name} aprendió que con valor y bondad, todo es posible."
-            },
-            "French": {
-                "intro": "Il était une fois, il y avait {gender_adj} de {age} ans nommé {name}.",
-                "adventure_start": "{name} découvrit quelque chose de magique qui allait tout changer.",
-                "conflict": "Mais {name} fit face à un grand défi qui testa son courage.",
-                "resolution": "Avec détermination et cœur, {name} trouva un moyen de surmonter l'obstacle.",
-                "ending": "Et ainsi {name} apprit qu'avec courage et gentillesse, tout est possible."
-            },
-            "Italian": {
-                "intro": "C'era una volta {gender_adj} di {age} anni chiamato {name}.",
-                "adventure_start": "{name} scoprì qualcosa di magico che avrebbe cambiato tutto.",
-                "conflict": "Ma {name} affrontò una grande sfida che mise alla prova il suo coraggio.",
-                "resolution": "Con determinazione e cuore, {name} trovò un modo per superare l'ostacolo.",
-                "ending": "E così {name} imparò che con coraggio e gentilezza, tutto è possibile."
-            },
-            "Arabic": {
-                "intro": "كان يا ما كان، كان هناك {gender_adj} يبلغ من العمر {age} عامًا يُدعى {name}.",
-                "adventure_start": "اكتشف {name} شيئًا سحريًا من شأنه أن يغير كل شيء.",
-                "conflict": "لكن {name} واجه تحديًا كبيرًا اختبر شجاعته.",
-                "resolution": "بالعزيمة والقلب، وجد {name} طريقة للتغلب على العقبة.",
-                "ending": "وهكذا تعلم {name} أنه بالشجاعة واللطف، كل شيء ممكن."
-            }
-        }
+        # Bound concurrent OpenAI calls from the async paths to respect rate limits
+        self.openai_semaphore = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "5")))
+        
+        # Character features extracted by OpenAI Vision, keyed by image content hash (LRU order)
+        self.vision_cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        
+        # Successful OpenAI story pages keyed by story parameters, as (expiry, pages) in LRU order
+        self.story_cache: "OrderedDict[Tuple, Tuple[float, Tuple[StoryPage, ...]]]" = OrderedDict()
+        # Batch results are cached from worker threads while the event loop reads the cache
+        self._story_cache_lock = threading.Lock()
+        
+        # In-flight OpenAI story completions keyed by story cache key, shared by identical concurrent requests
+        self._inflight_stories: Dict[Tuple, asyncio.Task] = {}
+        
+        
+    def _match_scene_keywords(self, content_lower: str) -> int:
+        """Return the bit mask of all scene table entries matching the content."""
+        # Keywords are lowercase ASCII, so empty or non-Latin (e.g. Arabic) content cannot match
+        if not _ASCII_LETTER_PATTERN.search(content_lower):
+            return 0
+        
+        mask = 0
+        for keyword in set(self.scene_pattern.findall(content_lower)):
+            mask |= self.scene_keyword_masks[keyword]
+        return mask
     
-    def _initialize_style_prompts(self) -> Dict[str, str]:
-        """Initialize style-specific prompts for image generation."""
-        return {
-            "Cartoon": "bright, animated, cartoon-style illustration with bold colors and fun characters",
-            "Storybook": "classic storybook illustration with soft watercolor style and whimsical details",
-            "Illustration": "detailed digital illustration with rich colors and artistic composition",
-            "Colorful": "vibrant, colorful artwork with dynamic composition and cheerful atmosphere",
-            "Simple": "minimalist, clean illustration with simple shapes and gentle colors"
-        }
+    def _get_prefix(self, request: TextWithImageRequest) -> Tuple[str, str, str, str]:
+        """Look up the precomputed prompt pieces for a request."""
+        return self.prefix_cache[(request.style, request.language, request.gender)]
     
     def _get_gender_adjective(self, gender: str, language: str) -> str:
         """Get gender-appropriate adjective for different languages."""
-        gender_map = {
-            "English": {"Male": "a young boy", "Female": "a young girl"},
-            "Spanish": {"Male": "un niño", "Female": "una niña"},
-            "French": {"Male": "un garçon", "Female": "une fille"},
-            "Italian": {"Male": "un ragazzo", "Female": "una ragazza"},
-            "Arabic": {"Male": "فتى", "Female": "فتاة"}
-        }
-        return gender_map.get(language, {}).get(gender, "a child")
+        return _GENDER_MAP.get(language, {}).get(gender, "a child")
     
     def _determine_pages_count(self, chapter_number: str) -> int:
         """Determine total number of pages based on chapter selection."""
-        chapter_map = {
-            "Single": 1,
-            "Two": 2,
-            "Four": 4,
-            "Six": 6,
-            "Ten": 10
-        }
-        return chapter_map.get(chapter_number, 1)
-    
-    def _determine_pages_count(self, chapter_number: str) -> int:
-        """Determine total number of pages based on chapter selection."""
-        chapter_map = {
-            "Single": 1,
-            "Two": 2,
-            "Four": 4,
-            "Six": 6,
-            "Ten": 10
-        }
-        return chapter_map.get(chapter_number, 1)
-    
-
+        return _CHAPTER_MAP.get(chapter_number, 1)
     
     def _generate_story_content(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> List[StoryPage]:
         """Generate story content based on user inputs."""
         pages = []
+        base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
         total_pages = self._determine_pages_count(request.chapter_number)
-        templates = self.story_templates.get(request.language, self.story_templates["English"])
-        gender_adj = self._get_gender_adjective(request.gender, request.language)
+        formatters = self.template_formatters.get(request.language, self.template_formatters["English"])
+        gender_adj = self._get_prefix(request)[1]
         
         # Base story elements
         story_elements = {
@@ -150,10 +489,10 @@ class TextWithImageService:
         
         if total_pages == 1:
             # Single page story
-            content = f"{templates['intro'].format(**story_elements)} {request.story_idea} {templates['ending'].format(**story_elements)}"
+            content = f"{formatters['intro'](story_elements)} {request.story_idea} {formatters['ending'](story_elements)}"
             page_title = f"The Adventure of {request.name}"
-            image_description = self._generate_image_description(content, request.name, request.style, 1, request, page_title, uploaded_image_path)
-            pages.append(StoryPage(
+            image_description = self._generate_image_description(content, request.name, request.style, 1, request, page_title, uploaded_image_path, base_character_desc)
+            pages.append(StoryPage.model_construct(
                 page_number=1,
                 title=page_title,
                 content=content,
@@ -162,26 +501,26 @@ class TextWithImageService:
         else:
             # Multi-page story
             story_structure = [
-                ("Introduction", templates["intro"]),
-                ("Adventure Begins", templates["adventure_start"]),
-                ("The Challenge", templates["conflict"]),
-                ("Resolution", templates["resolution"]),
-                ("Happy Ending", templates["ending"])
+                ("Introduction", formatters["intro"]),
+                ("Adventure Begins", formatters["adventure_start"]),
+                ("The Challenge", formatters["conflict"]),
+                ("Resolution", formatters["resolution"]),
+                ("Happy Ending", formatters["ending"])
             ]
             
             # Distribute content across pages
             for i in range(total_pages):
                 if i < len(story_structure):
-                    title, template = story_structure[i]
-                    content = template.format(**story_elements)
+                    title, format_template = story_structure[i]
+                    content = format_template(story_elements)
                     if i == 1:  # Adventure begins page
                         content += f" {request.story_idea}"
                 else:
                     title = f"Chapter {i + 1}"
                     content = f"The story of {request.name} continues with new adventures and discoveries."
                 
-                image_description = self._generate_image_description(content, request.name, request.style, i + 1, request, title, uploaded_image_path)
-                pages.append(StoryPage(
+                image_description = self._generate_image_description(content, request.name, request.style, i + 1, request, title, uploaded_image_path, base_character_desc)
+                pages.append(StoryPage.model_construct(
                     page_number=i + 1,
                     title=title,
                     content=content,
@@ -190,235 +529,478 @@ class TextWithImageService:
         
         return pages
     
-    def _generate_openai_story(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> List[StoryPage]:
+    def _build_openai_messages(self, request: TextWithImageRequest, total_pages: int) -> List[Dict[str, str]]:
+        """Build the chat messages for an OpenAI story generation request."""
+        prompt = _OPENAI_PROMPT_TEMPLATE.format(
+            total_pages=total_pages,
+            name=request.name,
+            age=request.age,
+            gender=request.gender.lower(),
+            story_idea=request.story_idea,
+            style=request.style,
+            language=request.language
+        )
+        return [_OPENAI_SYSTEM_MSG, {"role": "user", "content": prompt}]
+    
+    def _build_openai_body(self, request: TextWithImageRequest, total_pages: int) -> Dict[str, object]:
+        """Build the chat completion parameters shared by the direct and batch story requests."""
+        return {
+            "model": self.openai_model,
+            "messages": self._build_openai_messages(request, total_pages),
+            "max_tokens": max(_OPENAI_MIN_TOKENS, _OPENAI_TOKENS_PER_PAGE * total_pages),
+            "temperature": 0.7,
+            "response_format": _OPENAI_STORY_FORMAT
+        }
+    
+    def _build_openai_page(self, page_data: dict, request: TextWithImageRequest, uploaded_image_path: Optional[str], base_character_desc: str) -> StoryPage:
+        """Create a StoryPage with its image description from one parsed OpenAI page object."""
+        # Generate detailed image description based on actual page content with consistent character design
+        image_description = self._generate_image_description(
+            page_data["content"], 
+            request.name, 
+            request.style,
+            page_data["page_number"],
+            request,
+            page_data["title"],
+            uploaded_image_path,
+            base_character_desc
+        )
+        
+        # Validate the model output (coerces types, rejects missing fields so the caller falls back to templates)
+        return StoryPage(
+            page_number=page_data["page_number"],
+            title=page_data["title"],
+            content=page_data["content"],
+            image_description=image_description
+        )
+    
+    def _build_openai_pages(self, story_data: dict, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> List[StoryPage]:
+        """Create StoryPage objects with image descriptions from parsed OpenAI story JSON."""
+        if base_character_desc is None:
+            base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
+        return [
+            self._build_openai_page(page_data, request, uploaded_image_path, base_character_desc)
+            for page_data in story_data["pages"]
+        ]
+    
+    def _story_cache_key(self, request: TextWithImageRequest, base_character_desc: str) -> Tuple:
+        """Key OpenAI story pages by every request field in the prompt plus the character description (which reflects the photo)."""
+        return (
+            request.name,
+            request.age,
+            request.gender,
+            request.style,
+            request.language,
+            request.story_idea,
+            request.chapter_number,
+            base_character_desc
+        )
+    
+    def _get_cached_story(self, cache_key: Tuple) -> Optional[List[StoryPage]]:
+        """Return cached OpenAI story pages if present and not expired."""
+        with self._story_cache_lock:
+            entry = self.story_cache.get(cache_key)
+            if entry is None:
+                return None
+            expires_at, pages = entry
+            if expires_at < time.monotonic():
+                del self.story_cache[cache_key]
+                return None
+            self.story_cache.move_to_end(cache_key)
+        logger.info("Using cached OpenAI story")
+        return list(pages)
+    
+    def _cache_story(self, cache_key: Tuple, pages: List[StoryPage]) -> None:
+        """Store OpenAI story pages (immutable StoryPage objects), evicting the least recently used entry when full."""
+        with self._story_cache_lock:
+            self.story_cache[cache_key] = (time.monotonic() + _STORY_CACHE_TTL, tuple(pages))
+            self.story_cache.move_to_end(cache_key)
+            if len(self.story_cache) > _STORY_CACHE_SIZE:
+                self.story_cache.popitem(last=False)
+    
+    def _generate_openai_story(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> List[StoryPage]:
         """Generate story content using OpenAI API with 25-word limit per page."""
-        pages = []
         total_pages = self._determine_pages_count(request.chapter_number)
         
         if not OPENAI_AVAILABLE or not self.openai_client:
             # Fallback to template-based generation
-            return self._generate_template_story(request, uploaded_image_path)
+            return self._generate_template_story(request, uploaded_image_path, base_character_desc)
+        
+        # Identical story parameters and character return the cached OpenAI pages
+        if base_character_desc is None:
+            base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
+        cache_key = self._story_cache_key(request, base_character_desc)
+        cached_pages = self._get_cached_story(cache_key)
+        if cached_pages is not None:
+            return cached_pages
         
         try:
-            # Create OpenAI prompt for story generation
-            prompt = f"""
-            Create a {total_pages}-page children's story about {request.name}, a {request.age}-year-old {request.gender.lower()} character.
-            Story theme: {request.story_idea}
-            Style: {request.style}
-            Language: {request.language}
-            
-            Requirements:
-            - Each page should have EXACTLY 25 words or less
-            - Distribute the complete story across {total_pages} pages
-            - Make it age-appropriate and engaging
-            - Each page should advance the story
-            
-            Format your response as JSON:
-            {{
-                "pages": [
-                    {{
-                        "page_number": 1,
-                        "title": "Page Title",
-                        "content": "Story content (max 25 words)"
-                    }}
-                ]
-            }}
-            """
-            
-            logger.info(f"Generating {total_pages}-page story using OpenAI")
+            logger.info("Generating %s-page story using OpenAI", total_pages)
             
             # Make API call to OpenAI
             response = self.openai_client.chat.completions.create(
-                model=self.openai_model,
-                messages=[
-                    {"role": "system", "content": "You are a professional children's story writer. Always respond with valid JSON format."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
+                **self._build_openai_body(request, total_pages)
             )
             
             # Parse the response
-            import json
             content = response.choices[0].message.content
-            story_data = json.loads(content)
-            
-            # Create StoryPage objects with image descriptions
-            for page_data in story_data["pages"]:
-                # Generate detailed image description based on actual page content with consistent character design
-                image_description = self._generate_image_description(
-                    page_data["content"], 
-                    request.name, 
-                    request.style,
-                    page_data["page_number"],
-                    request,
-                    page_data["title"],
-                    uploaded_image_path
-                )
-                
-                pages.append(StoryPage(
-                    page_number=page_data["page_number"],
-                    title=page_data["title"],
-                    content=page_data["content"],
-                    image_description=image_description
-                ))
+            story_data = json_loads(content)
             
-            logger.info(f"Successfully generated {len(pages)} pages using OpenAI")
+            pages = self._build_openai_pages(story_data, request, uploaded_image_path, base_character_desc)
+            self._cache_story(cache_key, pages)
+            logger.info("Successfully generated %s pages using OpenAI", len(pages))
             return pages
             
         except Exception as e:
-            logger.error(f"OpenAI generation failed: {str(e)}. Falling back to templates.")
-            return self._generate_template_story(request, uploaded_image_path)
+            logger.error("OpenAI generation failed: %s. Falling back to templates.", e)
+            return self._generate_template_story(request, uploaded_image_path, base_character_desc)
     
-    def _generate_image_description(self, content: str, character_name: str, style: str, page_number: int, request: TextWithImageRequest = None, page_title: str = None, uploaded_image_path: Optional[str] = None) -> str:
-        """Generate detailed image description based on specific page content, maintaining consistency with cover design."""
-        # Use base character description for consistency across all pages
-        if request:
+    async def _generate_openai_story_async(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> List[StoryPage]:
+        """Generate story content with a streamed AsyncOpenAI completion without blocking the event loop."""
+        total_pages = self._determine_pages_count(request.chapter_number)
+        
+        if not OPENAI_AVAILABLE or not self.async_openai_client:
+            # Fallback to template-based generation
+            return self._generate_template_story(request, uploaded_image_path, base_character_desc)
+        
+        # Identical story parameters and character return the cached OpenAI pages
+        if base_character_desc is None:
             base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
+        cache_key = self._story_cache_key(request, base_character_desc)
+        cached_pages = self._get_cached_story(cache_key)
+        if cached_pages is not None:
+            return cached_pages
+        
+        # Identical concurrent requests share one in-flight completion
+        task = self._inflight_stories.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._stream_openai_story(request, total_pages, cache_key, uploaded_image_path, base_character_desc)
+            )
+            self._inflight_stories[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight_stories.pop(cache_key, None))
         else:
-            style_prompt = self.style_prompts.get(style, "illustration")
-            base_character_desc = f"{style_prompt}, featuring {character_name} as the main character"
+            logger.info("Joining in-flight OpenAI story for %s", request.name)
         
-        content_lower = content.lower()
+        # Shield the shared task so one client disconnecting does not cancel it for the others
+        return list(await asyncio.shield(task))
+    
+    async def _stream_openai_story(self, request: TextWithImageRequest, total_pages: int, cache_key: Tuple, uploaded_image_path: Optional[str], base_character_desc: str) -> List[StoryPage]:
+        """Stream one OpenAI story completion and cache its pages, falling back to templates on failure."""
+        try:
+            return [
+                page async for page in
+                self._iter_openai_story_pages(request, total_pages, cache_key, uploaded_image_path, base_character_desc)
+            ]
+        except Exception as e:
+            logger.error("OpenAI generation failed: %s. Falling back to templates.", e)
+            return self._generate_template_story(request, uploaded_image_path, base_character_desc)
+    
+    async def _iter_openai_story_pages(self, request: TextWithImageRequest, total_pages: int, cache_key: Tuple, uploaded_image_path: Optional[str], base_character_desc: str) -> AsyncIterator[StoryPage]:
+        """Yield each story page as soon as its JSON object is complete in the streamed completion, caching the full story."""
+        # A reader task holds the OpenAI concurrency slot only while the completion streams, so a slow
+        # consumer (e.g. an SSE client) cannot keep the slot; the queue holds at most one story's pages
+        pages_queue: "asyncio.Queue[Optional[StoryPage]]" = asyncio.Queue()
+        reader = asyncio.ensure_future(
+            self._read_openai_story_pages(request, total_pages, cache_key, uploaded_image_path, base_character_desc, pages_queue)
+        )
+        try:
+            while (page := await pages_queue.get()) is not None:
+                yield page
+            # Re-raise a failed or incomplete completion
+            await reader
+        finally:
+            reader.cancel()
+    
+    async def _read_openai_story_pages(self, request: TextWithImageRequest, total_pages: int, cache_key: Tuple, uploaded_image_path: Optional[str], base_character_desc: str, pages_queue: "asyncio.Queue[Optional[StoryPage]]") -> None:
+        """Stream one OpenAI story completion into the queue page by page, ending it with None."""
+        logger.info("Generating %s-page story using OpenAI (streaming)", total_pages)
         
-        # Extract detailed scene elements from content
-        scene_elements = []
-        objects_and_items = []
-        character_actions = []
-        emotions_and_mood = []
-        
-        # Enhanced location detection with more specific descriptions
-        locations = {
-            "forest": ["forest", "trees", "woods", "jungle"],
-            "magical enchanted forest with glowing trees and fairy lights": ["magical forest", "enchanted", "fairy"],
-            "royal castle with tall towers and golden gates": ["castle", "palace", "kingdom", "royal"],
-            "beautiful garden with colorful flowers and butterflies": ["garden", "flowers", "butterfly", "bloom"],
-            "mysterious cave with sparkling crystals": ["cave", "crystal", "underground"],
-            "peaceful meadow with rolling hills": ["meadow", "field", "grass", "hills"],
-            "cozy home with warm lighting": ["home", "house", "room", "attic"],
-            "starry night sky with twinkling stars": ["night", "stars", "moon", "sky"],
-            "sunny beach with golden sand": ["beach", "sand", "ocean", "sea"],
-            "snowy mountain peak": ["mountain", "snow", "peak", "cold"]
-        }
+        pages = []
+        parser = _StoryPageStreamParser()
         
-        location_found = "in a whimsical storybook setting"
-        for location_desc, keywords in locations.items():
-            if any(keyword in content_lower for keyword in keywords):
-                location_found = f"in {location_desc}"
-                break
+        try:
+            # Stream the completion so tokens are received while the model is still generating
+            async with self.openai_semaphore:
+                stream = await self.async_openai_client.chat.completions.create(
+                    **self._build_openai_body(request, total_pages),
+                    stream=True
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            for page_data in parser.feed(chunk.choices[0].delta.content):
+                                page = self._build_openai_page(page_data, request, uploaded_image_path, base_character_desc)
+                                pages.append(page)
+                                pages_queue.put_nowait(page)
+                finally:
+                    # Release the connection right away, also when the consumer went away mid-story
+                    await stream.close()
+            
+            if not parser.finished:
+                raise ValueError("Incomplete story JSON in OpenAI response")
+            
+            self._cache_story(cache_key, pages)
+            logger.info("Successfully generated %s pages using OpenAI", len(pages))
+        finally:
+            pages_queue.put_nowait(None)
+    
+    def submit_batch(self, requests: List[TextWithImageRequest]) -> str:
+        """Submit story requests as an OpenAI Batch job (lower cost, separate rate limits) and return the batch id."""
+        if not OPENAI_AVAILABLE or not self.openai_client:
+            raise RuntimeError("OpenAI client not available for batch generation")
         
-        # Enhanced object and item detection
-        items = {
-            "holding a magical paintbrush": ["paint", "brush", "canvas", "art"],
-            "surrounded by colorful butterflies": ["butterfly", "butterflies"],
-            "with a wise owl companion": ["owl", "bird"],
-            "near a treasure chest": ["treasure", "chest", "gold"],
-            "with a glowing wand": ["wand", "magic", "spell"],
-            "reading an ancient book": ["book", "reading", "story"],
-            "wearing a beautiful crown": ["crown", "princess", "prince"],
-            "with a friendly dragon": ["dragon", "creature"],
-            "holding a lantern": ["lantern", "light", "glow"],
-            "with musical instruments": ["music", "song", "singing"]
-        }
+        # One chat completion request per line, matched back to its story request by custom_id
+        batch_requests = {}
+        lines = []
+        for index, request in enumerate(requests):
+            custom_id = f"story-{index}"
+            batch_requests[custom_id] = request.model_dump(mode="json")
+            total_pages = self._determine_pages_count(request.chapter_number)
+            lines.append(json_dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": _OPENAI_BATCH_ENDPOINT,
+                "body": self._build_openai_body(request, total_pages)
+            }))
         
-        for item_desc, keywords in items.items():
-            if any(keyword in content_lower for keyword in keywords):
-                objects_and_items.append(item_desc)
-        
-        # Enhanced action detection
-        actions = {
-            "dancing gracefully": ["dance", "dancing", "twirl"],
-            "running through the scene": ["running", "chase", "hurry", "race"],
-            "flying through the air": ["fly", "flying", "soar"],
-            "climbing or exploring": ["climb", "explore", "adventure"],
-            "painting or creating art": ["paint", "draw", "create", "art"],
-            "discovering something wonderful": ["discover", "find", "found", "surprise"],
-            "talking to animals": ["talk", "speak", "conversation", "animal"],
-            "solving a puzzle or problem": ["solve", "think", "problem", "puzzle"],
-            "helping friends": ["help", "friend", "together", "team"],
-            "celebrating or cheering": ["celebrate", "cheer", "victory", "success"]
-        }
+        # The story requests are stored with OpenAI and linked from the batch metadata (whose values are
+        # too short to hold them), so any worker can collect the results, even after a restart
+        requests_file = self.openai_client.files.create(
+            file=("story_requests.json", json_dumps(batch_requests)),
+            purpose="user_data",
+            expires_after=_OPENAI_BATCH_FILE_EXPIRY
+        )
+        input_file = self.openai_client.files.create(
+            file=("stories.jsonl", b"\n".join(lines)),
+            purpose="batch",
+            expires_after=_OPENAI_BATCH_FILE_EXPIRY
+        )
+        batch = self.openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=_OPENAI_BATCH_ENDPOINT,
+            completion_window=_OPENAI_BATCH_WINDOW,
+            metadata={_OPENAI_BATCH_REQUESTS_KEY: requests_file.id},
+            output_expires_after=_OPENAI_BATCH_FILE_EXPIRY
+        )
+        logger.info("Submitted OpenAI batch %s with %s stories", batch.id, len(lines))
+        return batch.id
+    
+    def retrieve_batch(self, batch_id: str) -> Tuple[str, Optional[Dict[str, GeneratedStory]]]:
+        """Poll an OpenAI Batch job; return its status and, once completed, the stories by custom id."""
+        if not OPENAI_AVAILABLE or not self.openai_client:
+            raise RuntimeError("OpenAI client not available for batch generation")
+        
+        import openai
+        try:
+            batch = self.openai_client.batches.retrieve(batch_id)
+        except openai.NotFoundError:
+            raise KeyError(f"Unknown batch id: {batch_id}") from None
+        # Batches not submitted by this service carry no story requests
+        requests_file_id = (batch.metadata or {}).get(_OPENAI_BATCH_REQUESTS_KEY)
+        if requests_file_id is None:
+            raise KeyError(f"Unknown batch id: {batch_id}")
+        if batch.status in _OPENAI_BATCH_FAILED_STATUSES:
+            raise RuntimeError(f"OpenAI batch {batch_id} ended with status {batch.status}")
+        if batch.status != "completed":
+            logger.info("OpenAI batch %s is %s", batch_id, batch.status)
+            return batch.status, None
+        
+        # The prompts are no longer needed once the batch ran; the requests file stays so the batch can be collected again
+        try:
+            self.openai_client.files.delete(batch.input_file_id)
+        except openai.NotFoundError:
+            pass
         
-        for action_desc, keywords in actions.items():
-            if any(keyword in content_lower for keyword in keywords):
-                character_actions.append(action_desc)
-        
-        # Enhanced emotion and mood detection
-        emotions = {
-            "with a bright, joyful smile": ["happy", "joy", "smile", "laugh", "giggle"],
-            "with wonder and curiosity in their eyes": ["wonder", "curious", "amazed", "surprise"],
-            "with determination and courage": ["brave", "courage", "determined", "strong"],
-            "with a gentle, kind expression": ["kind", "gentle", "caring", "love"],
-            "with excitement and energy": ["excited", "energy", "enthusiastic"],
-            "with peaceful contentment": ["peaceful", "calm", "content", "serene"],
-            "with focused concentration": ["focus", "concentrate", "think", "study"],
-            "with magical sparkles around them": ["magic", "magical", "sparkle", "glow"]
+        batch_requests = {
+            custom_id: TextWithImageRequest.model_validate(data)
+            for custom_id, data in json_loads(self.openai_client.files.content(requests_file_id).content).items()
         }
+        stories = {}
+        if batch.output_file_id:
+            output = self.openai_client.files.content(batch.output_file_id).text
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                result = json_loads(line)
+                request = batch_requests.get(result.get("custom_id"))
+                if request is None:
+                    continue
+                base_character_desc = self._generate_base_character_description_with_image(request)
+                try:
+                    response = result["response"]
+                    if response["status_code"] != 200:
+                        raise ValueError(f"status code {response['status_code']}")
+                    story_data = json_loads(response["body"]["choices"][0]["message"]["content"])
+                    pages = self._build_openai_pages(story_data, request, None, base_character_desc)
+                    # Pre-generated stories also serve later identical interactive requests
+                    self._cache_story(self._story_cache_key(request, base_character_desc), pages)
+                except Exception as e:
+                    logger.error("OpenAI batch story %s failed: %s. Falling back to templates.", result.get('custom_id'), e)
+                    pages = self._generate_template_story(request, None, base_character_desc)
+                stories[result["custom_id"]] = self._build_story(request, pages, None, base_character_desc)
         
-        for emotion_desc, keywords in emotions.items():
-            if any(keyword in content_lower for keyword in keywords):
-                emotions_and_mood.append(emotion_desc)
+        # Requests missing from the output (e.g. listed in the error file) get template stories
+        for custom_id, request in batch_requests.items():
+            if custom_id not in stories:
+                stories[custom_id] = self._build_story(request, self._generate_template_story(request))
         
-        # Create page description similar to cover format
-        scene_elements = []
+        logger.info("Retrieved %s stories from OpenAI batch %s", len(stories), batch_id)
+        return batch.status, stories
+    
+    def _generate_image_description(self, content: str, character_name: str, style: str, page_number: int, request: TextWithImageRequest = None, page_title: str = None, uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> str:
+        """Generate detailed image description based on specific page content, maintaining consistency with cover design."""
+        # Use base character description for consistency across all pages (callers pass it in when precomputed)
+        if base_character_desc is None:
+            if request:
+                base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
+            else:
+                style_prompt = self.style_prompts.get(style, "illustration")
+                base_character_desc = f"{style_prompt}, featuring {character_name} as the main character"
         
-        if character_actions:
-            scene_elements.append(character_actions[0])
+        content_lower = content.lower()
         
-        if objects_and_items:
-            scene_elements.append(objects_and_items[0])
+        # Extract detailed scene elements from content in a single scan
+        scene_mask = self._match_scene_keywords(content_lower)
         
-        scene_elements.append(location_found)
+        # Create page description similar to cover format
+        scene_elements = []
         
-        if emotions_and_mood:
-            scene_elements.append(emotions_and_mood[0])
+        # Action, item, location and emotion; locations are prebuilt with their "in " prefix
+        for category in ("actions", "items", "locations", "emotions"):
+            category_mask = scene_mask & self.scene_category_masks[category]
+            if category_mask:
+                # Lowest set bit is the first matching entry of the category
+                scene_elements.append(self.scene_bit_descriptions[(category_mask & -category_mask).bit_length() - 1])
+            elif category == "locations":
+                scene_elements.append("in a whimsical storybook setting")
         
         # Build description in cover-like format
-        page_description = f"Page {page_number} illustration design. {base_character_desc}. "
+        description_parts = [f"Page {page_number} illustration design. {base_character_desc}. "]
         
         # Add scene description (similar to cover scene)
         if scene_elements:
-            page_description += f"Page scene depicts {', '.join(scene_elements[:2])}. "
+            description_parts.append(f"Page scene depicts {', '.join(scene_elements[:2])}. ")
         else:
-            page_description += "Page scene depicts the story content in an engaging atmosphere. "
+            description_parts.append("Page scene depicts the story content in an engaging atmosphere. ")
         
         # Add page-specific content context
-        content_words = content.split()
-        if len(content_words) > 5:
-            key_words = [word for word in content_words if len(word) > 4 and word.lower() not in 
-                        ['there', 'where', 'their', 'would', 'could', 'should', 'about', 'after', 'before']]
-            if key_words[:2]:
-                page_description += f"Story moment: '{' '.join(key_words[:2]).lower()}'. "
+        if len(content.split(None, 5)) > 5:
+            # Only the first two key words are used, so stop scanning once they are found
+            key_words = list(itertools.islice(
+                (word for match in _KEY_WORD_PATTERN.finditer(content) if (word := match.group().lower()) not in _STOPWORDS), 2
+            ))
+            if key_words:
+                description_parts.append(f"Story moment: '{' '.join(key_words)}'. ")
         
         # End similar to cover format
-        page_description += "Colorful, engaging design suitable for children's book"
+        description_parts.append("Colorful, engaging design suitable for children's book")
         
+        page_description = "".join(description_parts)
         return page_description
     
     def _generate_base_character_description(self, request: TextWithImageRequest) -> str:
         """Generate base character description for consistent visual design across all images."""
-        style_prompt = self.style_prompts.get(request.style, "illustration")
-        gender_adj = self._get_gender_adjective(request.gender, request.language).lower()
+        style_prompt, _, gender_adj, style_lower = self._get_prefix(request)
         
         # Create consistent character design description
         base_character_desc = (
             f"{style_prompt}, featuring {request.name} as the main character, "
             f"{gender_adj} of {request.age} years old. "
-            f"Character design: consistent appearance with {request.style.lower()} artistic style, "
+            f"Character design: consistent appearance with {style_lower} artistic style, "
             f"same facial features, hair style, clothing, and proportions throughout. "
             f"Story theme: {request.story_idea}"
         )
         
         return base_character_desc
     
-    def _encode_image_to_base64(self, image_path: str) -> str:
-        """Encode image to base64 for OpenAI Vision API."""
+    def _read_image_file(self, image_path: str) -> Tuple[bytes, str]:
+        """Read an uploaded image and return its bytes with a content hash for the Vision cache."""
         try:
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                image_data = image_file.read()
         except Exception as e:
-            logger.error(f"Error encoding image to base64: {str(e)}")
-            return ""
+            logger.error("Error reading image file: %s", e)
+            return b"", ""
+        return image_data, fingerprint_image(image_data)
+    
+    def _prepare_vision_image(self, image_data: bytes) -> Tuple[bytes, str]:
+        """Return the photo for Vision with its MIME subtype; rotated or large photos are turned upright, shrunk and re-encoded as JPEG."""
+        if not PIL_AVAILABLE:
+            return image_data, "jpeg"
+        try:
+            with Image.open(io.BytesIO(image_data)) as image:
+                mime_subtype = None if getattr(image, "is_animated", False) else _VISION_MIME_SUBTYPES.get(image.format)
+                # Phone photos are often stored sideways with an EXIF orientation tag
+                orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+                if mime_subtype and orientation == 1 and max(image.size) <= _VISION_MAX_EDGE:
+                    return image_data, mime_subtype
+                upright = ImageOps.exif_transpose(image)
+            upright.thumbnail((_VISION_MAX_EDGE, _VISION_MAX_EDGE), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            upright.convert("RGB").save(buffer, format="JPEG", quality=_VISION_JPEG_QUALITY)
+            return buffer.getvalue(), "jpeg"
+        except Exception as e:
+            logger.warning("Could not prepare image for analysis: %s", e)
+            return image_data, "jpeg"
+    
+    def _encode_image_data_url(self, image_data: bytes) -> str:
+        """Encode image as a base64 data URL for OpenAI Vision API, downscaling large photos first."""
+        vision_data, mime_subtype = self._prepare_vision_image(image_data)
+        return f"data:image/{mime_subtype};base64,{base64.b64encode(vision_data).decode('utf-8')}"
+    
+    def _get_cached_features(self, image_hash: str) -> Optional[Dict[str, str]]:
+        """Return a copy of previously extracted character features for an image hash, if cached."""
+        features = self.vision_cache.get(image_hash)
+        if features is None:
+            return None
+        self.vision_cache.move_to_end(image_hash)
+        logger.info("Using cached character analysis")
+        return dict(features)
+    
+    def _cache_features(self, image_hash: str, features: Dict[str, str]) -> None:
+        """Store extracted character features, evicting the least recently used entry when full."""
+        self.vision_cache[image_hash] = dict(features)
+        if len(self.vision_cache) > _VISION_CACHE_SIZE:
+            self.vision_cache.popitem(last=False)
+    
+    def _build_vision_messages(self, image_url: str) -> List[Dict]:
+        """Build the chat messages asking OpenAI Vision for the character's physical features."""
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": _VISION_ANALYSIS_PROMPT},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            }
+        ]
+    
+    def _parse_character_features(self, analysis_text: str) -> Dict[str, str]:
+        """Extract skin, hair and eyebrow colors from the Vision JSON response."""
+        logger.info("Character analysis result: %s", analysis_text)
+        
+        data = json_loads(analysis_text)
+        if not isinstance(data, dict):
+            raise ValueError("Vision response is not a JSON object")
+        
+        features = {}
+        for key in _VISION_FEATURE_KEYS:
+            value = data.get(key)
+            if isinstance(value, str) and value.strip():
+                features[key] = value.strip().lower()
+        
+        # Fallback: if eyebrow color not specified, assume it matches hair color
+        if 'hair_color' in features and 'eyebrow_color' not in features:
+            features['eyebrow_color'] = features['hair_color']
+        
+        logger.info("Extracted character features: %s", features)
+        return features
     
     def _analyze_character_features(self, image_path: str) -> Dict[str, str]:
         """Analyze uploaded image to extract character features using OpenAI Vision API."""
@@ -427,91 +1009,75 @@ class TextWithImageService:
             return {}
         
         try:
-            # Encode image to base64
-            base64_image = self._encode_image_to_base64(image_path)
-            if not base64_image:
+            # Reuse the analysis of identical image content
+            image_data, image_hash = self._read_image_file(image_path)
+            if not image_data:
                 return {}
+            cached = self._get_cached_features(image_hash)
+            if cached is not None:
+                return cached
             
-            # Prepare the prompt for character analysis
-            analysis_prompt = """
-            Analyze this image of a person and extract the following physical characteristics:
-            1. Skin color (be specific: light, medium, tan, brown, dark, etc.)
-            2. Hair color (be specific: blonde, brown, black, red, gray, etc.)
-            3. Eyebrow color (usually matches hair color)
-            
-            Please provide a JSON response with these exact keys:
-            - skin_color
-            - hair_color
-            - eyebrow_color
-            
-            Be descriptive but concise. Focus on the main character in the image.
-            """
+            # Encode image as a base64 data URL
+            image_url = self._encode_image_data_url(image_data)
             
             # Make API call to OpenAI Vision
             response = self.openai_client.chat.completions.create(
-                model="gpt-4-vision-preview",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": analysis_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=300
+                model=_VISION_MODEL,
+                messages=self._build_vision_messages(image_url),
+                max_tokens=300,
+                response_format=_OPENAI_RESPONSE_FORMAT
             )
             
-            # Extract the response
-            analysis_text = response.choices[0].message.content
-            logger.info(f"Character analysis result: {analysis_text}")
+            features = self._parse_character_features(response.choices[0].message.content)
+            self._cache_features(image_hash, features)
+            return features
             
-            # Try to extract features from the response
-            features = {}
-            lines = analysis_text.lower().split('\n')
+        except Exception as e:
+            logger.error("Error analyzing character features: %s", e)
+            return {}
+    
+    async def _analyze_character_features_async(self, image_path: str) -> Dict[str, str]:
+        """Analyze uploaded image with AsyncOpenAI Vision without blocking the event loop."""
+        if not self.async_openai_client or not image_path:
+            logger.warning("OpenAI client not available or no image path provided")
+            return {}
+        
+        try:
+            # Reuse the analysis of identical image content; read and hash off the event loop
+            image_data, image_hash = await asyncio.to_thread(self._read_image_file, image_path)
+            if not image_data:
+                return {}
+            cached = self._get_cached_features(image_hash)
+            if cached is not None:
+                return cached
             
-            for line in lines:
-                if 'skin' in line and 'color' in line:
-                    # Extract skin color
-                    parts = line.split(':')
-                    if len(parts) > 1:
-                        features['skin_color'] = parts[1].strip().replace('"', '').replace(',', '')
-                elif 'hair' in line and 'color' in line:
-                    # Extract hair color
-                    parts = line.split(':')
-                    if len(parts) > 1:
-                        features['hair_color'] = parts[1].strip().replace('"', '').replace(',', '')
-                elif 'eyebrow' in line and 'color' in line:
-                    # Extract eyebrow color
-                    parts = line.split(':')
-                    if len(parts) > 1:
-                        features['eyebrow_color'] = parts[1].strip().replace('"', '').replace(',', '')
+            # Encode image as a base64 data URL off the event loop
+            image_url = await asyncio.to_thread(self._encode_image_data_url, image_data)
             
-            # Fallback: if eyebrow color not specified, assume it matches hair color
-            if 'hair_color' in features and 'eyebrow_color' not in features:
-                features['eyebrow_color'] = features['hair_color']
+            # Make API call to OpenAI Vision
+            async with self.openai_semaphore:
+                response = await self.async_openai_client.chat.completions.create(
+                    model=_VISION_MODEL,
+                    messages=self._build_vision_messages(image_url),
+                    max_tokens=300,
+                    response_format=_OPENAI_RESPONSE_FORMAT
+                )
             
-            logger.info(f"Extracted character features: {features}")
+            features = self._parse_character_features(response.choices[0].message.content)
+            self._cache_features(image_hash, features)
             return features
             
         except Exception as e:
-            logger.error(f"Error analyzing character features: {str(e)}")
+            logger.error("Error analyzing character features: %s", e)
             return {}
     
-    def _generate_base_character_description_with_image(self, request: TextWithImageRequest, image_path: Optional[str] = None) -> str:
+    def _generate_base_character_description_with_image(self, request: TextWithImageRequest, image_path: Optional[str] = None, character_features: Optional[Dict[str, str]] = None) -> str:
         """Generate base character description incorporating features from uploaded image."""
-        style_prompt = self.style_prompts.get(request.style, "illustration")
-        gender_adj = self._get_gender_adjective(request.gender, request.language).lower()
+        style_prompt, _, gender_adj, style_lower = self._get_prefix(request)
         
-        # Analyze character features from image if provided
-        character_features = {}
-        if image_path:
-            character_features = self._analyze_character_features(image_path)
+        # Analyze character features from image if provided and not already analyzed by the caller
+        if character_features is None:
+            character_features = self._analyze_character_features(image_path) if image_path else {}
         
         # Build character description with or without image features
         base_desc = (
@@ -534,7 +1100,7 @@ class TextWithImageService:
         
         # Add consistency requirements
         base_desc += (
-            f" Character design: consistent appearance with {request.style.lower()} artistic style, "
+            f" Character design: consistent appearance with {style_lower} artistic style, "
             f"same facial features, hair style, clothing, and proportions throughout. "
             f"Story theme: {request.story_idea}"
         )
@@ -555,9 +1121,10 @@ class TextWithImageService:
         
         return cover_description
     
-    def _generate_cover_image_description_with_image(self, request: TextWithImageRequest, image_path: Optional[str] = None) -> str:
+    def _generate_cover_image_description_with_image(self, request: TextWithImageRequest, image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> str:
         """Generate a book cover description incorporating features from uploaded image."""
-        base_character_desc = self._generate_base_character_description_with_image(request, image_path)
+        if base_character_desc is None:
+            base_character_desc = self._generate_base_character_description_with_image(request, image_path)
         
         # Create cover description using base character design
         cover_description = (
@@ -573,32 +1140,24 @@ class TextWithImageService:
         """Generate story title based on character name."""
         return f"The Amazing Adventures of {character_name}"
     
-    def _generate_template_story(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> List[StoryPage]:
+    def _generate_template_story(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> List[StoryPage]:
         """Fallback method using templates when OpenAI is not available."""
         pages = []
+        if base_character_desc is None:
+            base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path)
         total_pages = self._determine_pages_count(request.chapter_number)
-        templates = self.story_templates.get(request.language, self.story_templates["English"])
-        gender_adj = self._get_gender_adjective(request.gender, request.language)
-        
-        # Base story elements
-        story_elements = {
-            "name": request.name,
-            "age": request.age,
-            "gender_adj": gender_adj,
-            "idea": request.story_idea
-        }
         
         if total_pages == 1:
             # Single page story (limit to 25 words)
             content = f"Once upon a time, {request.name} discovered something magical. {request.story_idea}. The adventure changed everything forever."
-            content = " ".join(content.split()[:25])  # Limit to 25 words
+            content = " ".join(content.split(None, 25)[:25])  # Limit to 25 words
             
             page_title = f"The Adventure of {request.name}"
-            pages.append(StoryPage(
+            pages.append(StoryPage.model_construct(
                 page_number=1,
                 title=page_title,
                 content=content,
-                image_description=self._generate_image_description(content, request.name, request.style, 1, request, page_title, uploaded_image_path)
+                image_description=self._generate_image_description(content, request.name, request.style, 1, request, page_title, uploaded_image_path, base_character_desc)
             ))
         else:
             # Multi-page story
@@ -617,61 +1176,145 @@ class TextWithImageService:
                     content = f"{request.name} continued the amazing adventure with new discoveries."
                 
                 # Limit to 25 words
-                content = " ".join(content.split()[:25])
+                content = " ".join(content.split(None, 25)[:25])
                 
                 page_title = f"Chapter {i + 1}"
-                pages.append(StoryPage(
+                pages.append(StoryPage.model_construct(
                     page_number=i + 1,
                     title=page_title,
                     content=content,
-                    image_description=self._generate_image_description(content, request.name, request.style, i + 1, request, page_title, uploaded_image_path)
+                    image_description=self._generate_image_description(content, request.name, request.style, i + 1, request, page_title, uploaded_image_path, base_character_desc)
                 ))
         
         return pages
 
+    def _build_story(self, request: TextWithImageRequest, pages: List[StoryPage], uploaded_image_path: Optional[str] = None, base_character_desc: Optional[str] = None) -> GeneratedStory:
+        """Assemble the complete story from generated pages."""
+        # Fields come from the validated request and pages, so skip re-validation
+        return GeneratedStory.model_construct(
+            story_title=self._generate_story_title(request.name),
+            character_name=request.name,
+            character_gender=request.gender.value,
+            character_age=request.age,
+            style=request.style.value,
+            language=request.language.value,
+            total_chapters=self._determine_pages_count(request.chapter_number),
+            cover_image_description=self._generate_cover_image_description_with_image(request, uploaded_image_path, base_character_desc),
+            pages=pages
+        )
+    
     def generate_story_with_images(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> GeneratedStory:
         """Generate a complete story with images based on user input."""
         try:
-            logger.info(f"Generating story for {request.name} with {request.chapter_number} chapters")
+            logger.info("Generating story for %s with %s chapters", request.name, request.chapter_number)
+            
+            # Analyze the uploaded image and build the character description once for the cover and every page
+            character_features = self._analyze_character_features(uploaded_image_path) if uploaded_image_path else {}
+            base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path, character_features)
             
             # Generate story pages using OpenAI
-            pages = self._generate_openai_story(request, uploaded_image_path)
+            pages = self._generate_openai_story(request, uploaded_image_path, base_character_desc)
             
             # Create the complete story
-            story = GeneratedStory(
-                story_title=self._generate_story_title(request.name),
-                character_name=request.name,
-                character_gender=request.gender,
-                character_age=request.age,
-                style=request.style,
-                language=request.language,
-                total_chapters=self._determine_pages_count(request.chapter_number),
-                cover_image_description=self._generate_cover_image_description_with_image(request, uploaded_image_path),
-                pages=pages
-            )
+            story = self._build_story(request, pages, uploaded_image_path, base_character_desc)
             
-            logger.info(f"Successfully generated story with {len(pages)} pages")
+            logger.info("Successfully generated story with %s pages", len(pages))
             return story
             
         except Exception as e:
-            logger.error(f"Error generating story: {str(e)}")
+            logger.error("Error generating story: %s", e)
             raise Exception(f"Failed to generate story: {str(e)}")
     
-    def get_service_info(self) -> dict:
-        """Get service information and capabilities."""
-        return {
+    async def generate_story_with_images_async(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> GeneratedStory:
+        """Generate a complete story with images, awaiting the OpenAI story call."""
+        try:
+            logger.info("Generating story for %s with %s chapters", request.name, request.chapter_number)
+            
+            # Analyze the uploaded image and build the character description once for the cover and every page
+            character_features = await self._analyze_character_features_async(uploaded_image_path) if uploaded_image_path else {}
+            base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path, character_features)
+            
+            # Generate story pages using streamed OpenAI completion
+            pages = await self._generate_openai_story_async(request, uploaded_image_path, base_character_desc)
+            
+            # Create the complete story
+            story = self._build_story(request, pages, uploaded_image_path, base_character_desc)
+            
+            logger.info("Successfully generated story with %s pages", len(pages))
+            return story
+            
+        except Exception as e:
+            logger.error("Error generating story: %s", e)
+            raise Exception(f"Failed to generate story: {str(e)}")
+    
+    async def stream_story_with_images_async(self, request: TextWithImageRequest, uploaded_image_path: Optional[str] = None) -> AsyncIterator[Union[StoryPage, GeneratedStory]]:
+        """Yield story pages as soon as each is generated, then the complete story."""
+        logger.info("Streaming story for %s with %s chapters", request.name, request.chapter_number)
+        
+        # Analyze the uploaded image and build the character description once for the cover and every page
+        character_features = await self._analyze_character_features_async(uploaded_image_path) if uploaded_image_path else {}
+        base_character_desc = self._generate_base_character_description_with_image(request, uploaded_image_path, character_features)
+        total_pages = self._determine_pages_count(request.chapter_number)
+        cache_key = self._story_cache_key(request, base_character_desc)
+        
+        # A new OpenAI story is streamed page by page; cached, in-flight and template stories arrive whole.
+        # Streams join an identical in-flight story from the non-streaming path but do not register
+        # their own: a stream is tied to one client and may stop mid-story, so others cannot await it.
+        # Its finished pages still go into the story cache for later requests.
+        streamable = OPENAI_AVAILABLE and self.async_openai_client is not None and cache_key not in self._inflight_stories
+        pages = self._get_cached_story(cache_key) if streamable else None
+        if pages is None and streamable:
+            pages = []
+            try:
+                async for page in self._iter_openai_story_pages(request, total_pages, cache_key, uploaded_image_path, base_character_desc):
+                    pages.append(page)
+                    yield page
+            except Exception as e:
+                logger.error("OpenAI generation failed: %s. Falling back to templates.", e)
+                # Pages already sent cannot be withdrawn, so template pages only fill in the rest
+                sent = len(pages)
+                pages.extend(self._generate_template_story(request, uploaded_image_path, base_character_desc)[sent:])
+                for page in pages[sent:]:
+                    yield page
+        else:
+            if pages is None:
+                pages = await self._generate_openai_story_async(request, uploaded_image_path, base_character_desc)
+            for page in pages:
+                yield page
+        
+        yield self._build_story(request, pages, uploaded_image_path, base_character_desc)
+    
+    def _initialize_service_info(self) -> Mapping[str, object]:
+        """Build the read-only service information and capabilities once."""
+        return MappingProxyType({
             "service": "Text with Image Story Generator",
             "description": "Generate personalized stories with custom characters and images",
             "version": "1.0.0",
-            "supported_genders": [gender.value for gender in GenderEnum],
-            "supported_styles": [style.value for style in StyleEnum],
-            "supported_languages": [lang.value for lang in LanguageEnum],
-            "supported_chapters": [chapter.value for chapter in ChapterEnum],
-            "features": [
+            "supported_genders": tuple(gender.value for gender in GenderEnum),
+            "supported_styles": tuple(style.value for style in StyleEnum),
+            "supported_languages": tuple(lang.value for lang in LanguageEnum),
+            "supported_chapters": tuple(chapter.value for chapter in ChapterEnum),
+            "features": (
                 "Personalized character integration",
                 "Multi-language support",
                 "Various artistic styles",
                 "Flexible chapter lengths",
                 "Image-based character representation"
-            ]
-        }
+            )
+        })
+    
+    async def close(self):
+        """Close the pooled OpenAI HTTP connections"""
+        if self.async_openai_client is not None:
+            await self.async_openai_client.close()
+        if self.openai_client is not None:
+            self.openai_client.close()
+        logger.info("Text-with-Image OpenAI clients closed")
+    
+    def get_service_info(self) -> Mapping[str, object]:
+        """Get service information and capabilities."""
+        return self._service_info
+
+# Create a singleton instance
+text_with_image_service = TextWithImageService()
+
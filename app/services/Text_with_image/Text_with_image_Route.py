@@ -1,28 +1,144 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, HTTPException, UploadFile, File, Form
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
 import time
 import os
 import uuid
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 import logging
+from pydantic import ValidationError
+try:
+    import aiofiles
+    AIOFILES_AVAILABLE = True
+except ImportError:
+    AIOFILES_AVAILABLE = False
+    logging.warning("aiofiles package not available. Install with: pip install aiofiles")
 from .Text_with_image_Schema import (
     TextWithImageRequest,
     TextWithImageResponse,
-    GenderEnum,
-    StyleEnum,
-    LanguageEnum,
-    ChapterEnum
+    StoryBatchResponse,
+    StoryPage
 )
-from .Text_with_image import TextWithImageService
+from .Text_with_image import text_with_image_service
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Module logger (logging is configured once in main.py)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/text-with-image", tags=["Text with Image"])
 
-# Initialize service
-text_service = TextWithImageService()
+# Uploaded character photos are stored here only until the story is generated; point UPLOAD_DIR at a
+# RAM-backed path (e.g. /dev/shm/text_with_image) to keep disk I/O off the request path
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads/text_with_image")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Uploads are streamed to disk in chunks so memory stays flat regardless of file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Upper bound on the stories one request may queue as an OpenAI batch
+STORY_BATCH_MAX_SIZE = 50
+
+async def save_upload(upload: UploadFile, path: str) -> None:
+    """Stream an uploaded file to disk in chunks without blocking the event loop"""
+    if AIOFILES_AVAILABLE:
+        async with aiofiles.open(path, "wb") as buffer:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await buffer.write(chunk)
+        return
+    
+    # Fallback: run the blocking file operations in the default thread pool
+    buffer = await asyncio.to_thread(open, path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await asyncio.to_thread(buffer.write, chunk)
+    finally:
+        await asyncio.to_thread(buffer.close)
+
+def build_story_request(gender: str, name: str, age: int, style: str, language: str, story_idea: str, chapter_number: str) -> TextWithImageRequest:
+    """Create the story request from the submitted form fields, validating enums and limits in one pass
+    
+    Invalid fields raise RequestValidationError so FastAPI answers 422 like for any other form field.
+    """
+    try:
+        return TextWithImageRequest.model_validate({
+            "gender": gender,
+            "name": name,
+            "age": age,
+            "style": style,
+            "language": language,
+            "story_idea": story_idea,
+            "chapter_number": chapter_number
+        })
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+
+async def remove_story_image(uploaded_image_path: Optional[str]) -> None:
+    """Delete a saved character photo once the story no longer needs it (safe to call twice)"""
+    if uploaded_image_path is None:
+        return
+    try:
+        await asyncio.to_thread(os.remove, uploaded_image_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not remove uploaded image %s: %s", uploaded_image_path, e)
+
+async def save_story_image(image: Optional[UploadFile]) -> Optional[str]:
+    """Save the optional character photo under a unique name and return its path"""
+    if not image or not image.filename:
+        return None
+    
+    # Generate unique filename
+    file_extension = os.path.splitext(image.filename)[1]
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    uploaded_image_path = os.path.join(UPLOAD_DIR, unique_filename)
+    
+    # Save uploaded file, removing any partial file if the upload fails or the request is cancelled
+    try:
+        await save_upload(image, uploaded_image_path)
+    except BaseException:
+        await remove_story_image(uploaded_image_path)
+        raise
+    
+    logger.info("Image uploaded successfully: %s", uploaded_image_path)
+    return uploaded_image_path
+
+async def story_event_stream(request: TextWithImageRequest, uploaded_image_path: Optional[str], start_time: float) -> AsyncIterator[str]:
+    """Format a streamed story as Server-Sent Events: one page event per page, then a done or error event"""
+    try:
+        async for item in text_with_image_service.stream_story_with_images_async(request, uploaded_image_path):
+            if isinstance(item, StoryPage):
+                yield f"event: page\ndata: {item.model_dump_json()}\n\n"
+                continue
+            
+            response = TextWithImageResponse(
+                success=True,
+                message=f"Story generated successfully for {request.name}!",
+                story=item,
+                processing_time=time.perf_counter() - start_time
+            )
+            # Pages were already sent as page events
+            yield f"event: done\ndata: {response.model_dump_json(exclude={'story': {'pages'}})}\n\n"
+    
+    except Exception as e:
+        logger.error("Error streaming story: %s", e)
+        response = TextWithImageResponse(
+            success=False,
+            message=f"Failed to generate story: {str(e)}",
+            story=None,
+            processing_time=time.perf_counter() - start_time
+        )
+        yield f"event: error\ndata: {response.model_dump_json()}\n\n"
+    
+    finally:
+        await remove_story_image(uploaded_image_path)
 
 @router.post("/generate-story-simple", response_model=TextWithImageResponse)
 async def generate_story_simple(
@@ -36,45 +152,22 @@ async def generate_story_simple(
     chapter_number: str = Form(...)
 ):
     """Generate a personalized story with optional image upload for character analysis."""
-    start_time = time.time()
+    start_time = time.perf_counter()
+    uploaded_image_path = None
     
     try:
         # Create request object from form data
-        request = TextWithImageRequest(
-            gender=GenderEnum(gender),
-            name=name,
-            age=age,
-            style=StyleEnum(style),
-            language=LanguageEnum(language),
-            story_idea=story_idea,
-            chapter_number=ChapterEnum(chapter_number)
-        )
+        request = build_story_request(gender, name, age, style, language, story_idea, chapter_number)
         
-        logger.info(f"Generating story for {request.name}")
+        logger.info("Generating story for %s", request.name)
         
         # Handle image upload if provided
-        uploaded_image_path = None
-        if image and image.filename:
-            # Create uploads directory if it doesn't exist
-            upload_dir = "uploads/text_with_image"
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Generate unique filename
-            file_extension = os.path.splitext(image.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            uploaded_image_path = os.path.join(upload_dir, unique_filename)
-            
-            # Save uploaded file
-            with open(uploaded_image_path, "wb") as buffer:
-                content = await image.read()
-                buffer.write(content)
-            
-            logger.info(f"Image uploaded successfully: {uploaded_image_path}")
+        uploaded_image_path = await save_story_image(image)
         
         # Generate story with or without uploaded image
-        generated_story = text_service.generate_story_with_images(request, uploaded_image_path=uploaded_image_path)
+        generated_story = await text_with_image_service.generate_story_with_images_async(request, uploaded_image_path=uploaded_image_path)
         
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         
         return TextWithImageResponse(
             success=True,
@@ -83,12 +176,93 @@ async def generate_story_simple(
             processing_time=processing_time
         )
         
+    except RequestValidationError:
+        # Re-raise validation errors so FastAPI returns 422
+        raise
+    except Exception as e:
+        logger.error("Error generating simple story: %s", e)
+        return TextWithImageResponse(
+            success=False,
+            message=f"Failed to generate story: {str(e)}",
+            story=None,
+            processing_time=time.perf_counter() - start_time
+        )
+    
+    finally:
+        await remove_story_image(uploaded_image_path)
+
+@router.post("/generate-story-stream")
+async def generate_story_stream(
+    image: Optional[UploadFile] = File(None),
+    gender: str = Form(...),
+    name: str = Form(...),
+    age: int = Form(...),
+    style: str = Form(...),
+    language: str = Form(...),
+    story_idea: str = Form(...),
+    chapter_number: str = Form(...)
+):
+    """Stream a personalized story as Server-Sent Events, sending each page as soon as it is generated."""
+    start_time = time.perf_counter()
+    
+    try:
+        request = build_story_request(gender, name, age, style, language, story_idea, chapter_number)
+        
+        logger.info("Streaming story for %s", request.name)
+        
+        # The upload is saved before streaming starts, while the request body is still available
+        uploaded_image_path = await save_story_image(image)
+        
+    except RequestValidationError:
+        # Re-raise validation errors so FastAPI returns 422
+        raise
     except Exception as e:
-        logger.error(f"Error generating simple story: {str(e)}")
+        logger.error("Error streaming story: %s", e)
         return TextWithImageResponse(
             success=False,
             message=f"Failed to generate story: {str(e)}",
             story=None,
-            processing_time=time.time() - start_time
+            processing_time=time.perf_counter() - start_time
         )
+    
+    # The stream removes the photo when it ends; the background task also covers a response whose
+    # body never starts iterating (e.g. the client disconnected first)
+    return StreamingResponse(
+        story_event_stream(request, uploaded_image_path, start_time),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(remove_story_image, uploaded_image_path)
+    )
 
+@router.post("/story-batches", response_model=StoryBatchResponse)
+async def submit_story_batch(requests: List[TextWithImageRequest] = Body(..., min_length=1, max_length=STORY_BATCH_MAX_SIZE)):
+    """Queue story requests as an OpenAI Batch job; collect the stories later by batch id."""
+    try:
+        batch_id = await asyncio.to_thread(text_with_image_service.submit_batch, requests)
+        return StoryBatchResponse(
+            success=True,
+            message=f"Submitted {len(requests)} stories for batch generation",
+            batch_id=batch_id
+        )
+    except Exception as e:
+        logger.error("Error submitting story batch: %s", e)
+        return StoryBatchResponse(success=False, message=f"Failed to submit story batch: {str(e)}")
+
+@router.get("/story-batches/{batch_id}", response_model=StoryBatchResponse)
+async def get_story_batch(batch_id: str):
+    """Return the status of an OpenAI story batch, and its stories once completed."""
+    try:
+        status, stories = await asyncio.to_thread(text_with_image_service.retrieve_batch, batch_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown story batch: {batch_id}")
+    except Exception as e:
+        logger.error("Error retrieving story batch %s: %s", batch_id, e)
+        return StoryBatchResponse(success=False, message=f"Failed to retrieve story batch: {str(e)}", batch_id=batch_id)
+    
+    return StoryBatchResponse(
+        success=True,
+        message=f"Batch {status}" if stories is None else f"Retrieved {len(stories)} stories",
+        batch_id=batch_id,
+        status=status,
+        stories=stories
+    )
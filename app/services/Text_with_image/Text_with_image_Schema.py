@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict
 from enum import Enum
 
 class GenderEnum(str, Enum):
@@ -28,6 +28,8 @@ class ChapterEnum(str, Enum):
     TEN = "Ten"
 
 class TextWithImageRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     gender: GenderEnum = Field(..., description="Character gender: Male or Female")
     name: str = Field(..., min_length=1, max_length=50, description="Character name")
     age: int = Field(..., ge=1, le=100, description="Character age")
@@ -37,12 +39,16 @@ class TextWithImageRequest(BaseModel):
     chapter_number: ChapterEnum = Field(..., description="Number of chapters: Single, Two, Four, Six, or Ten")
 
 class StoryPage(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     page_number: int = Field(..., description="Page number")
     title: str = Field(..., description="Page title")
     content: str = Field(..., description="Page content/text")
     image_description: str = Field(..., description="Description of the image for this page")
 
 class GeneratedStory(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     story_title: str = Field(..., description="Generated story title")
     character_name: str = Field(..., description="Main character name")
     character_gender: str = Field(..., description="Character gender")
@@ -54,11 +60,22 @@ class GeneratedStory(BaseModel):
     pages: List[StoryPage] = Field(..., description="List of story pages")
     
 class TextWithImageResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     success: bool = Field(..., description="Whether the story generation was successful")
     message: str = Field(..., description="Response message")
     story: Optional[GeneratedStory] = Field(None, description="Generated story data")
     processing_time: Optional[float] = Field(None, description="Processing time in seconds")
 
+class StoryBatchResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    success: bool = Field(..., description="Whether the batch request was successful")
+    message: str = Field(..., description="Response message")
+    batch_id: Optional[str] = Field(None, description="OpenAI batch id")
+    status: Optional[str] = Field(None, description="OpenAI batch status")
+    stories: Optional[Dict[str, GeneratedStory]] = Field(None, description="Generated stories by request id, once the batch completed")
+
 class ServiceInfoResponse(BaseModel):
     service: str
     description: str
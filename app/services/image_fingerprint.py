@@ -0,0 +1,15 @@
+import hashlib
+import logging
+from typing import Union
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+    logging.warning("xxhash package not available. Install with: pip install xxhash")
+
+def fingerprint_image(data: Union[bytes, bytearray, memoryview]) -> str:
+    """Non-cryptographic cache key for image bytes, using xxh3-128 when available"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
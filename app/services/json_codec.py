@@ -0,0 +1,20 @@
+import json
+import logging
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logging.warning("orjson package not available. Install with: pip install orjson")
+
+def json_dumps(obj) -> bytes:
+    """Serialize an object to JSON bytes using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def json_loads(data):
+    """Parse JSON from bytes or str using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,7 +1,16 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging once for the whole application, before the services are imported
+logging.basicConfig(level=logging.INFO)
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.services.Text_with_image.Text_with_image_Route import router as text_with_image_router
 from app.services.Image_to_Image.Image_to_Image_Route import router as image_to_image_router
+from app.services.Image_to_Image.Image_to_Image import image_to_image_service
+from app.services.Text_with_image.Text_with_image import text_with_image_service
 import os
 from dotenv import load_dotenv
 
@@ -9,7 +18,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Create necessary directories
-os.makedirs("uploads/text_with_image", exist_ok=True)
 os.makedirs("uploads/image_to_image", exist_ok=True)
 os.makedirs("logs", exist_ok=True)
 
@@ -62,6 +70,19 @@ async def startup_event():
         print("Warning: ARK_API_KEY not found in environment variables")
     else:
         print("✅ API configuration loaded successfully")
+    
+    # Bound the default executor used by asyncio.to_thread so bursts of uploads
+    # cannot spawn an unbounded number of validation/encoding threads
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=8))
+    
+    # Open the shared HTTP session for the Image-to-Image service
+    await image_to_image_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event to release shared resources"""
+    await image_to_image_service.close()
+    await text_with_image_service.close()
 
 if __name__ == "__main__":
     import uvicorn